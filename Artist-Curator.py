@@ -1,12 +1,33 @@
 import smartpy as sp
 FA2_contract = sp.io.import_stored_contract('FA2.py')
 addresses = sp.io.import_stored_contract('addresses.py')
+events = sp.io.import_stored_contract('events.py')
+curation_merkle = sp.io.import_stored_contract('curation_merkle.py')
+
+
+class ArtProposal:
+    def get_type(self):
+        return sp.TRecord(artist = sp.TAddress,art_metadata = sp.TBytes,price=sp.TNat,editions=sp.TNat,mint_index = sp.TNat, time_of_creation=sp.TTimestamp,time_of_expiration=sp.TTimestamp,votes_in_favour=sp.TNat,votes_in_against=sp.TNat,is_minted=sp.TBool)
+
+
+class LazyListing:
+    def get_type(self):
+        return sp.TRecord(price = sp.TMutez, editions = sp.TNat, sold = sp.TNat)
 
 
 class MainContract(sp.Contract):
     
-    def __init__(self,  nft_contract_address=addresses.NFT):
+    def __init__(self,  nft_contract_address=addresses.NFT, lazy_storage=True):
     # def __init__(self):
+
+        # With `lazy_storage` the profiles and art proposals are kept in
+        # big-maps, so a vote only loads the proposal it is about instead of
+        # every proposal ever made. Regular maps are easier to inspect.
+        if lazy_storage:
+            my_map = sp.big_map
+        else:
+            my_map = sp.map
+
         self.init(
 
             #The admin who will be able to accept the curators
@@ -28,16 +49,33 @@ class MainContract(sp.Contract):
             min_voting_percent = sp.nat(40),
             
             # For storing profile details
-            profile = sp.map(l ={},tkey = sp.TAddress, tvalue = sp.TBytes),
+            profile = my_map(l ={},tkey = sp.TAddress, tvalue = sp.TBytes),
 
             # It will map the ids of the proposed arts of the artist to their address
-            art_proposal_ids = sp.map(l ={},tkey = sp.TAddress, tvalue = sp.TSet(t=sp.TNat)),
+            art_proposal_ids = my_map(l ={},tkey = sp.TAddress, tvalue = sp.TSet(t=sp.TNat)),
 
             # For storing art proposal details
-            art_proposal_details = sp.map(l ={},tkey = sp.TNat, tvalue = sp.TRecord(artist = sp.TAddress,art_metadata = sp.TBytes,price=sp.TNat,editions=sp.TNat,mint_index = sp.TNat, time_of_creation=sp.TTimestamp,time_of_expiration=sp.TTimestamp,curators_in_favour=sp.TSet(t=sp.TAddress),curators_in_against=sp.TSet(t=sp.TAddress),is_minted=sp.TBool)),
+            art_proposal_details = my_map(l ={},tkey = sp.TNat, tvalue = ArtProposal().get_type()),
+
+            # For storing how each curator voted on each art proposal (True is in favour)
+            art_proposal_votes = sp.big_map(l ={},tkey = sp.TPair(sp.TNat, sp.TAddress), tvalue = sp.TBool),
 
             # For storing the number of art proposals
             art_proposal_counter = sp.nat(0),
+
+            # Approved art proposals put on sale without minting, with the price
+            # of one edition and the number of editions left to mint
+            lazy_listings = sp.big_map(l ={},tkey = sp.TNat, tvalue = LazyListing().get_type()),
+
+            # Proceeds of lazy sales, withdrawn by the artists with `withdraw`
+            balances = sp.big_map(l ={},tkey = sp.TAddress, tvalue = sp.TMutez),
+
+            # Addresses allowed to post curation results besides the admin
+            relayers = sp.set(t=sp.TAddress),
+
+            # Merkle root of the art proposals approved in each curation round,
+            # built off-chain from the curators' signed votes
+            curation_roots = sp.big_map(l ={},tkey = sp.TNat, tvalue = sp.TBytes),
             
             #curator proposal mapped to their address
             # curator_proposal_details = sp.map(l ={},tkey = sp.TAddress, tvalue = sp.TRecord(curator_description_cid = sp.TString,time_of_creation = sp.TTimestamp,is_voted=sp.TBool)),
@@ -65,6 +103,84 @@ class MainContract(sp.Contract):
         """
         sp.verify(self.data.pause == False, message="CONTRACT_PAUSED")
 
+    def record_vote(self, _art_proposal_id, in_favour):
+        """Records the vote of the sender on an art proposal and updates the
+        tallies. A curator who already voted the other way has that vote moved
+        over, so every curator is counted once.
+
+        """
+        key = sp.local("key", sp.pair(_art_proposal_id, sp.sender))
+        proposal = self.data.art_proposal_details[_art_proposal_id]
+        if in_favour:
+            sp.if self.data.art_proposal_votes.contains(key.value):
+                proposal.votes_in_against = sp.as_nat(proposal.votes_in_against - 1)
+            proposal.votes_in_favour += 1
+        else:
+            sp.if self.data.art_proposal_votes.contains(key.value):
+                proposal.votes_in_favour = sp.as_nat(proposal.votes_in_favour - 1)
+            proposal.votes_in_against += 1
+        self.data.art_proposal_votes[key.value] = in_favour
+
+    def check_is_approved(self, proposal):
+        """Checks that the voting on an art proposal is over, that it reached
+        the minimum percentage of votes and that it was not minted yet.
+
+        """
+        sp.verify(proposal.time_of_expiration<sp.now,"Minting is only possible once the expiration time has crossed")
+        votes = proposal.votes_in_favour + proposal.votes_in_against
+        sp.verify((votes > 0) & ((proposal.votes_in_favour*100)/votes>=self.data.min_voting_percent), message="NOT_APPROVED")
+        sp.verify(proposal.is_minted == False,"Already minted")
+
+    def mint_proposal(self, _art_proposal_id):
+        """Mints every edition of an art proposal to the sender under the next
+        mint index and marks the proposal as minted.
+
+        """
+        ##Changing the value of is_minted to note the minting done by the artist
+        self.data.art_proposal_details[_art_proposal_id].is_minted = True
+        self.data.art_proposal_details[_art_proposal_id].mint_index = self.data.mint_index
+        
+
+        # Inter-contract call take place here to mint the artwork
+        
+        c = sp.contract(
+            sp.TRecord(
+                token_id=sp.TNat,
+                amount=sp.TNat,
+                address=sp.TAddress,
+                metadata=sp.TMap(sp.TString, sp.TBytes),
+            ),
+            self.data.nft_contract_address,
+            "mint",
+        ).open_some()
+
+        sp.transfer(
+                    sp.record(
+                        token_id=self.data.mint_index,
+                        amount=self.data.art_proposal_details[_art_proposal_id].editions,
+                        address=sp.sender,
+                        metadata={"": self.data.art_proposal_details[_art_proposal_id].art_metadata},
+                    ),
+                    sp.tez(0),
+                    c,
+                )
+        
+        self.data.mint_index += 1
+
+    def check_merkle_proof(self, leaf, proof, root):
+        """Checks that `leaf` is in the Merkle tree of `root`. Each node is the
+        blake2b of its two children in increasing order, so the proof is just
+        the list of siblings from the leaf up.
+
+        """
+        node = sp.local("node", leaf)
+        sp.for sibling in proof:
+            sp.if node.value < sibling:
+                node.value = sp.blake2b(node.value + sibling)
+            sp.else:
+                node.value = sp.blake2b(sibling + node.value)
+        sp.verify(node.value == root, message="INVALID_PROOF")
+
     @sp.onchain_view()
     def getCuratorDetails(self):
         return sp.result(self.data.curators)
@@ -98,7 +214,7 @@ class MainContract(sp.Contract):
 
         self.data.art_proposal_counter+=1
         
-        self.data.art_proposal_details[self.data.art_proposal_counter] = sp.record(artist = sp.sender,art_metadata = params._art_metadata, price = params._art_price, editions = params._editions, mint_index = sp.nat(0), time_of_creation = sp.now, time_of_expiration = params._time_of_expiration, curators_in_favour = sp.set(),curators_in_against = sp.set(),is_minted=False)
+        self.data.art_proposal_details[self.data.art_proposal_counter] = sp.record(artist = sp.sender,art_metadata = params._art_metadata, price = params._art_price, editions = params._editions, mint_index = sp.nat(0), time_of_creation = sp.now, time_of_expiration = params._time_of_expiration, votes_in_favour = sp.nat(0),votes_in_against = sp.nat(0),is_minted=False)
 
         sp.if ~self.data.art_proposal_ids.contains(sp.sender):
             
@@ -140,16 +256,10 @@ class MainContract(sp.Contract):
         sp.verify(self.data.art_proposal_details[_art_proposal_id].time_of_expiration>sp.now,"Time for voting has expired")
 
         #Checking if already voted in favour of the art
-        sp.verify(~ self.data.art_proposal_details[_art_proposal_id].curators_in_favour.contains(sp.sender),"You have already voted in favour")
+        sp.verify(self.data.art_proposal_votes.get(sp.pair(_art_proposal_id, sp.sender), default_value = False) == False,"You have already voted in favour")
 
-        #Adding the curator address in the list of in favour votes
-        sp.if sp.len(self.data.art_proposal_details[_art_proposal_id].curators_in_favour) == 0:
-            
-            self.data.art_proposal_details[_art_proposal_id].curators_in_favour = sp.set([sp.sender], t = sp.TAddress)
-            
-        sp.else:
-
-            self.data.art_proposal_details[_art_proposal_id].curators_in_favour.add(sp.sender)
+        #Recording the vote and counting it in favour
+        self.record_vote(_art_proposal_id, True)
 
 
     # Voting against the art by the curator
@@ -172,16 +282,10 @@ class MainContract(sp.Contract):
         sp.verify(self.data.art_proposal_details[_art_proposal_id].time_of_expiration>sp.now,"Time for voting has expired")
 
         #Checking if already voted against the art
-        sp.verify(~ self.data.art_proposal_details[_art_proposal_id].curators_in_against.contains(sp.sender),"You have already voted against the art proposal")
+        sp.verify(self.data.art_proposal_votes.get(sp.pair(_art_proposal_id, sp.sender), default_value = True) == True,"You have already voted against the art proposal")
 
-        #Adding the curator address in the list of against the artwork votes
-        sp.if sp.len(self.data.art_proposal_details[_art_proposal_id].curators_in_against) == 0:
-            
-            self.data.art_proposal_details[_art_proposal_id].curators_in_against = sp.set([sp.sender], t = sp.TAddress)
-            
-        sp.else:
-
-            self.data.art_proposal_details[_art_proposal_id].curators_in_against.add(sp.sender)
+        #Recording the vote and counting it against
+        self.record_vote(_art_proposal_id, False)
 
 
     # Accepting the curator( by the admin )
@@ -252,24 +356,153 @@ class MainContract(sp.Contract):
         #Check if a profile exists
         sp.verify(self.data.profile.contains(sp.sender), message="Make a profile to proceed")
         
-        #Checking if the time the curator is voting is less than the art_voting_time
-        sp.verify(self.data.art_proposal_details[_art_proposal_id].time_of_expiration<sp.now,"Minting is only possible once the expiration time has crossed")
-
         #Check if the artist is calling
         sp.verify(self.data.art_proposal_ids[sp.sender].contains(_art_proposal_id))
 
-        sp.verify((sp.len(self.data.art_proposal_details[_art_proposal_id].curators_in_favour)*100)/(sp.len(self.data.art_proposal_details[_art_proposal_id].curators_in_favour)+sp.len(self.data.art_proposal_details[_art_proposal_id].curators_in_against))>=self.data.min_voting_percent)
+        self.check_is_approved(self.data.art_proposal_details[_art_proposal_id])
+
+        self.mint_proposal(_art_proposal_id)
+
+
+    #Posting the result of a curation round voted off-chain
+    @sp.entry_point
+    def post_curation_root(self,params):
+
+        sp.set_type(params, sp.TRecord(_round=sp.TNat,_root=sp.TBytes))
+
+        #Checking if the contract is allowed to run by the admin
+        self.check_is_paused()
+
+        sp.verify((self.data.admin == sp.sender) | self.data.relayers.contains(sp.sender), message="NOT_ADMIN_OR_RELAYER")
+
+        #A posted result can't be changed
+        sp.verify(~self.data.curation_roots.contains(params._round), message="ROUND_ALREADY_POSTED")
+
+        self.data.curation_roots[params._round] = params._root
+
+        events.CURATION_ROOT_POSTED.emit(round = params._round, root = params._root)
+
+
+    #Minting an art proposal approved in a curation round, proven by a Merkle proof
+    @sp.entry_point
+    def art_mint_with_proof(self,params):
+
+        sp.set_type(params, sp.TRecord(_round=sp.TNat,_art_proposal_id=sp.TNat,_proof=sp.TList(sp.TBytes)))
+
+        #Checking if the contract is allowed to run by the admin
+        self.check_is_paused()
+
+        proposal = self.data.art_proposal_details[params._art_proposal_id]
+
+        #Check if the artist is calling
+        sp.verify(proposal.artist == sp.sender, message="NOT_ARTIST")
 
         #Check if already minted
-        sp.verify(self.data.art_proposal_details[_art_proposal_id].is_minted == False,"Already minted")
+        sp.verify(proposal.is_minted == False,"Already minted")
 
-        ##Changing the value of is_minted to note the minting done by the artist
-        self.data.art_proposal_details[_art_proposal_id].is_minted = True
-        self.data.art_proposal_details[_art_proposal_id].mint_index = self.data.mint_index
-        
+        #The leaf commits to the round, so a proposal approved in one round can't be claimed against another
+        self.check_merkle_proof(
+            sp.blake2b(sp.pack(sp.pair(params._round, params._art_proposal_id))),
+            params._proof,
+            self.data.curation_roots.get(params._round, message="INVALID_ROUND"))
+
+        self.mint_proposal(params._art_proposal_id)
+
+
+    #Minting every approved art proposal of a curation round with a single call to the NFT contract
+    @sp.entry_point
+    def art_mint_batch(self,_art_proposal_ids):
+
+        sp.set_type(_art_proposal_ids, sp.TList(sp.TNat))
+
+        #Checking if the contract is allowed to run by the admin
+        self.check_is_paused()
+
+        mints = sp.local("mints", sp.list([], t = sp.TRecord(token_id=sp.TNat, address=sp.TAddress, amount=sp.TNat, metadata=sp.TMap(sp.TString, sp.TBytes))))
+
+        sp.for _art_proposal_id in _art_proposal_ids:
+
+            proposal = self.data.art_proposal_details[_art_proposal_id]
+
+            #Only the admin or the artist of the proposal can finalize it
+            sp.verify((self.data.admin == sp.sender) | (proposal.artist == sp.sender), message="NOT_ADMIN_OR_ARTIST")
+
+            #Proposals that are still open, already minted or that did not pass are skipped
+            votes = proposal.votes_in_favour + proposal.votes_in_against
+            sp.if (proposal.time_of_expiration < sp.now) & (proposal.is_minted == False) & (votes > 0):
+                sp.if (proposal.votes_in_favour*100)/votes >= self.data.min_voting_percent:
+                    proposal.is_minted = True
+                    proposal.mint_index = self.data.mint_index
+                    mints.value.push(sp.record(token_id=self.data.mint_index, address=proposal.artist, amount=proposal.editions, metadata={"": proposal.art_metadata}))
+                    self.data.mint_index += 1
+
+        # Inter-contract call take place here to mint all the artworks at once
+        sp.if sp.len(mints.value) > 0:
+            c = sp.contract(
+                sp.TList(sp.TRecord(
+                    token_id=sp.TNat,
+                    amount=sp.TNat,
+                    address=sp.TAddress,
+                    metadata=sp.TMap(sp.TString, sp.TBytes),
+                )),
+                self.data.nft_contract_address,
+                "mint_batch",
+            ).open_some()
+
+            # Token ids have to reach the NFT contract in increasing order
+            sp.transfer(mints.value.rev(), sp.tez(0), c)
+
+
+    #Putting an approved art proposal on sale without minting it: every edition is minted to its buyer on purchase
+    @sp.entry_point
+    def lazy_list(self,params):
+
+        sp.set_type(params, sp.TRecord(_art_proposal_id=sp.TNat,_price=sp.TMutez,_editions=sp.TNat))
+
+        #Checking if the contract is allowed to run by the admin
+        self.check_is_paused()
+
+        proposal = self.data.art_proposal_details[params._art_proposal_id]
+
+        #Check if the artist is calling
+        sp.verify(proposal.artist == sp.sender, message="NOT_ARTIST")
+
+        self.check_is_approved(proposal)
+
+        sp.verify((params._editions > 0) & (params._editions <= proposal.editions), message="INVALID_EDITIONS")
+
+        #The proposal can't be minted through art_mint anymore, its editions get their token ids when they are sold
+        proposal.is_minted = True
+        self.data.lazy_listings[params._art_proposal_id] = sp.record(price = params._price, editions = params._editions, sold = sp.nat(0))
+
+        events.LAZY_LISTING_CREATED.emit(proposal_id = params._art_proposal_id, artist = sp.sender, price = params._price, editions = params._editions)
+
+
+    #Buying the next edition of a lazy listing, which is minted straight to the buyer.
+    #Unlike art_mint, which mints all editions under one token id, every edition sold here gets its own token id:
+    #the NFT contract is non-fungible with consecutive token ids, so a token id can't be minted again on a later sale.
+    #The proposal's mint_index records the token id of its first edition; LAZY_MINTED lists every one.
+    @sp.entry_point
+    def lazy_buy(self,_art_proposal_id):
+
+        sp.set_type(_art_proposal_id, sp.TNat)
+
+        #Checking if the contract is allowed to run by the admin
+        self.check_is_paused()
+
+        sp.verify(self.data.lazy_listings.contains(_art_proposal_id), message="INVALID_LISTING")
+
+        listing = self.data.lazy_listings[_art_proposal_id]
+        proposal = self.data.art_proposal_details[_art_proposal_id]
+
+        sp.verify(sp.amount == listing.price, message="INVALID_AMOUNT")
+
+        sp.if listing.sold == 0:
+            proposal.mint_index = self.data.mint_index
+        listing.sold += 1
+
+        # Inter-contract call take place here to mint the edition to the buyer
 
-        # Inter-contract call take place here to mint the artwork
-        
         c = sp.contract(
             sp.TRecord(
                 token_id=sp.TNat,
@@ -284,16 +517,57 @@ class MainContract(sp.Contract):
         sp.transfer(
                     sp.record(
                         token_id=self.data.mint_index,
-                        amount=self.data.art_proposal_details[_art_proposal_id].editions,
+                        amount=1,
                         address=sp.sender,
-                        metadata={"": self.data.art_proposal_details[_art_proposal_id].art_metadata},
+                        metadata={"": proposal.art_metadata},
                     ),
                     sp.tez(0),
                     c,
                 )
-        
+
+        events.LAZY_MINTED.emit(proposal_id = _art_proposal_id, token = sp.record(address = self.data.nft_contract_address, token_id = self.data.mint_index), artist = proposal.artist, buyer = sp.sender, amount = sp.amount)
+
         self.data.mint_index += 1
 
+        sp.if listing.editions == 1:
+            del self.data.lazy_listings[_art_proposal_id]
+        sp.else:
+            listing.editions = sp.as_nat(listing.editions - 1)
+
+        #Crediting the artist, who withdraws the proceeds: an artist contract rejecting tez can't block the sale
+        sp.if sp.amount > sp.mutez(0):
+            self.data.balances[proposal.artist] = self.data.balances.get(proposal.artist, default_value = sp.mutez(0)) + sp.amount
+            events.BALANCE_CREDITED.emit(recipient = proposal.artist, amount = sp.amount)
+
+
+    #Withdrawing the proceeds credited to the sender
+    @sp.entry_point
+    def withdraw(self):
+
+        amount = sp.local("amount", self.data.balances.get(sp.sender, default_value = sp.mutez(0)))
+        sp.verify(amount.value > sp.mutez(0), message="NOTHING_TO_WITHDRAW")
+        del self.data.balances[sp.sender]
+        sp.send(sp.sender, amount.value)
+        events.BALANCE_WITHDRAWN.emit(recipient = sp.sender, amount = amount.value)
+
+
+    # Allowing an address to post curation results ( by the admin )
+    @sp.entry_point
+    def add_relayer(self,_relayer_address):
+
+        # Check if the admin executed the entry point 
+        self.check_is_admin()
+
+        self.data.relayers.add(_relayer_address)
+
+    # Removing an address from the relayers ( by the admin )
+    @sp.entry_point
+    def remove_relayer(self,_relayer_address):
+
+        # Check if the admin executed the entry point 
+        self.check_is_admin()
+
+        self.data.relayers.remove(_relayer_address)
 
     #To change the minimum voting percent
     @sp.entry_point
@@ -370,6 +644,8 @@ def test():
     scenario += dao.vote_on_artproposal(2).run(sender = bob, now = sp.timestamp(20))
     scenario += dao.art_mint(1).run(sender = alice,now = sp.timestamp(32),valid=False)
     scenario += dao.art_mint(2).run(sender = charles, now = sp.timestamp(32))
+    scenario += dao.art_mint_batch([1, 2]).run(sender = admin, now = sp.timestamp(32))
+    scenario += dao.art_mint_batch([1]).run(sender = charles, now = sp.timestamp(32), valid=False)
     scenario += dao.revoke_curator(sp.address("tz1hJgZdhnRGvg5XD6pYxRCsbWh4jg5HQ476")).run(sender = admin)
     scenario += dao.change_min_voting(30).run(sender = admin)
     scenario += dao.change_admin(sp.address("tz1hJgZdhnRGvg5XD6pYxRCsbWh4jg5HQ476")).run(sender = admin)
@@ -377,3 +653,193 @@ def test():
     scenario += dao.create_profile(sp.bytes('0x30')).run(sender = charles)
     scenario += dao.create_profile(sp.bytes('0x31')).run(sender = charles)
     scenario += dao.create_profile(sp.bytes('0x32')).run(sender = bob)
+
+
+@sp.add_test(name="main-LazyMint")
+def test():
+    scenario = sp.test_scenario()
+    scenario.h1("Lazy minting of curated editions")
+
+    alice = sp.test_account("alice")
+    bob = sp.test_account("bob")
+    charles = sp.test_account("charles")
+    david = sp.test_account("david")
+
+    admin = sp.address("tz1QXAR4RsVTXYU75XBU9ctMYkWYFnZYbgzk")
+    nft = FA2_contract.FA2(config = FA2_contract.FA2_config(non_fungible = True), metadata = sp.map({"": sp.utils.bytes_of_string("https://example.com")}), admin = admin)
+    scenario += nft
+
+    dao = MainContract(nft_contract_address = nft.address, lazy_storage = True)
+    dao.update_initial_storage(
+        curators = sp.set([bob.address], t = sp.TAddress),
+        profile = sp.big_map(l = {alice.address: sp.bytes("0x30"), bob.address: sp.bytes("0x31")}, tkey = sp.TAddress, tvalue = sp.TBytes),
+    )
+    scenario += dao
+
+    # The NFT contract only lets its administrator mint, so the curation contract has to be it
+    scenario += nft.set_administrator(dao.address).run(sender = admin)
+
+    scenario.h2("Approved proposal")
+    scenario += dao.art_proposal(_art_metadata = sp.bytes("0xdaad"),_art_price=5,_editions=3,_time_of_expiration = sp.timestamp(28)).run(sender = alice)
+    scenario += dao.vote_on_artproposal(1).run(sender = bob, now = sp.timestamp(20))
+
+    scenario.h2("Listing")
+    scenario += dao.lazy_list(_art_proposal_id = 1, _price = sp.tez(5), _editions = 2).run(sender = alice, now = sp.timestamp(20), valid = False)
+    scenario += dao.lazy_list(_art_proposal_id = 1, _price = sp.tez(5), _editions = 2).run(sender = charles, now = sp.timestamp(32), valid = False)
+    scenario += dao.lazy_list(_art_proposal_id = 1, _price = sp.tez(5), _editions = 4).run(sender = alice, now = sp.timestamp(32), valid = False)
+    scenario += dao.lazy_list(_art_proposal_id = 1, _price = sp.tez(5), _editions = 2).run(sender = alice, now = sp.timestamp(32))
+    scenario += dao.art_mint(1).run(sender = alice, now = sp.timestamp(32), valid = False)
+
+    scenario.h2("Purchases")
+    scenario += dao.lazy_buy(1).run(sender = charles, amount = sp.tez(4), valid = False)
+    scenario += dao.lazy_buy(1).run(sender = charles, amount = sp.tez(5))
+    scenario.verify(dao.data.lazy_listings[1].sold == 1)
+    scenario += dao.lazy_buy(1).run(sender = david, amount = sp.tez(5))
+    # Each edition has its own token id; the proposal records the first one
+    scenario.verify(dao.data.art_proposal_details[1].mint_index == 0)
+    scenario.verify(nft.data.ledger[nft.ledger_key.make(charles.address, 0)].balance == 1)
+    scenario.verify(nft.data.ledger[nft.ledger_key.make(david.address, 1)].balance == 1)
+    scenario.verify(dao.data.mint_index == 2)
+    scenario.verify(~dao.data.lazy_listings.contains(1))
+    scenario += dao.lazy_buy(1).run(sender = charles, amount = sp.tez(5), valid = False)
+
+    scenario.h2("Proceeds")
+    scenario.verify(dao.data.balances[alice.address] == sp.tez(10))
+    scenario += dao.withdraw().run(sender = alice)
+    scenario += dao.withdraw().run(sender = alice, valid = False)
+    scenario.verify(~dao.data.balances.contains(alice.address))
+
+
+@sp.add_test(name="main-MintBatch")
+def test():
+    scenario = sp.test_scenario()
+    scenario.h1("Minting a round of proposals in one call")
+
+    admin = sp.address("tz1QXAR4RsVTXYU75XBU9ctMYkWYFnZYbgzk")
+    alice = sp.test_account("alice")
+    bob = sp.test_account("bob")
+    charles = sp.test_account("charles")
+
+    nft = FA2_contract.FA2(config = FA2_contract.FA2_config(non_fungible = True), metadata = sp.map({"": sp.utils.bytes_of_string("https://example.com")}), admin = admin)
+    scenario += nft
+
+    dao = MainContract(nft_contract_address = nft.address, lazy_storage = True)
+    dao.update_initial_storage(
+        curators = sp.set([bob.address], t = sp.TAddress),
+        profile = sp.big_map(l = {alice.address: sp.bytes("0x30"), bob.address: sp.bytes("0x31"), charles.address: sp.bytes("0x32")}, tkey = sp.TAddress, tvalue = sp.TBytes),
+    )
+    scenario += dao
+
+    # The NFT contract only lets its administrator mint, so the curation contract has to be it
+    scenario += nft.set_administrator(dao.address).run(sender = admin)
+
+    scenario.h2("Proposals")
+    scenario += dao.art_proposal(_art_metadata = sp.bytes("0xdaad"),_art_price=5,_editions=3,_time_of_expiration = sp.timestamp(28)).run(sender = alice)
+    scenario += dao.art_proposal(_art_metadata = sp.bytes("0xbeef"),_art_price=5,_editions=4,_time_of_expiration = sp.timestamp(28)).run(sender = charles)
+    scenario += dao.art_proposal(_art_metadata = sp.bytes("0xcafe"),_art_price=5,_editions=2,_time_of_expiration = sp.timestamp(28)).run(sender = alice)
+    scenario += dao.vote_on_artproposal(1).run(sender = bob, now = sp.timestamp(20))
+    scenario += dao.vote_on_artproposal(2).run(sender = bob, now = sp.timestamp(20))
+    scenario += dao.vote_against_artproposal(3).run(sender = bob, now = sp.timestamp(20))
+
+    scenario.h2("Batch mint")
+    scenario += dao.art_mint_batch([1, 3, 2]).run(sender = charles, now = sp.timestamp(32), valid = False)
+    scenario += dao.art_mint_batch([1, 3, 2]).run(sender = admin, now = sp.timestamp(32))
+    scenario.verify(nft.data.ledger[nft.ledger_key.make(alice.address, 0)].balance == 3)
+    scenario.verify(nft.data.ledger[nft.ledger_key.make(charles.address, 1)].balance == 4)
+    scenario.verify(dao.data.art_proposal_details[1].is_minted)
+    scenario.verify(dao.data.art_proposal_details[1].mint_index == 0)
+    scenario.verify(dao.data.art_proposal_details[2].is_minted)
+    scenario.verify(dao.data.art_proposal_details[2].mint_index == 1)
+    scenario.verify(~dao.data.art_proposal_details[3].is_minted)
+    scenario.verify(dao.data.mint_index == 2)
+
+    scenario.h2("Already minted proposals are skipped")
+    scenario += dao.art_mint_batch([2]).run(sender = charles, now = sp.timestamp(33))
+    scenario.verify(dao.data.mint_index == 2)
+
+
+@sp.add_test(name="main-CurationRound")
+def test():
+    scenario = sp.test_scenario()
+    scenario.h1("Curation round posted as a Merkle root")
+
+    admin = sp.address("tz1QXAR4RsVTXYU75XBU9ctMYkWYFnZYbgzk")
+    alice = sp.test_account("alice")
+    charles = sp.test_account("charles")
+    relayer = sp.test_account("relayer")
+
+    nft = FA2_contract.FA2(config = FA2_contract.FA2_config(non_fungible = True), metadata = sp.map({"": sp.utils.bytes_of_string("https://example.com")}), admin = admin)
+    scenario += nft
+
+    dao = MainContract(nft_contract_address = nft.address, lazy_storage = True)
+    dao.update_initial_storage(
+        profile = sp.big_map(l = {alice.address: sp.bytes("0x30"), charles.address: sp.bytes("0x31")}, tkey = sp.TAddress, tvalue = sp.TBytes),
+    )
+    scenario += dao
+    scenario += nft.set_administrator(dao.address).run(sender = admin)
+
+    scenario.h2("Proposals")
+    scenario += dao.art_proposal(_art_metadata = sp.bytes("0xdaad"),_art_price=5,_editions=3,_time_of_expiration = sp.timestamp(28)).run(sender = alice)
+    scenario += dao.art_proposal(_art_metadata = sp.bytes("0x30"),_art_price=5,_editions=4,_time_of_expiration = sp.timestamp(28)).run(sender = charles)
+    scenario += dao.art_proposal(_art_metadata = sp.bytes("0x31"),_art_price=5,_editions=1,_time_of_expiration = sp.timestamp(28)).run(sender = alice)
+
+    scenario.h2("The packing of the offline tool matches PACK")
+    scenario.verify(sp.pack(sp.pair(sp.nat(1), sp.nat(300))) == sp.bytes("0x" + curation_merkle.pack_pair(1, 300).hex()))
+    for in_favour in [True, False]:
+        scenario.verify(sp.pack(sp.pair(sp.nat(1), sp.pair(sp.nat(300), in_favour))) == sp.bytes("0x" + curation_merkle.pack_vote(1, 300, in_favour).hex()))
+
+    # Proposals 1 and 3 were approved off-chain in round 1, proposal 2 was not
+    tree = curation_merkle.Tree(1, [1, 3])
+    def proof(proposal_id):
+        return [sp.bytes("0x" + h.hex()) for h in tree.proof(proposal_id)]
+
+    scenario.h2("Posting the result")
+    scenario += dao.post_curation_root(_round = 1, _root = sp.bytes("0x" + tree.root.hex())).run(sender = relayer.address, valid = False)
+    scenario += dao.add_relayer(relayer.address).run(sender = admin)
+    scenario += dao.post_curation_root(_round = 1, _root = sp.bytes("0x" + tree.root.hex())).run(sender = relayer.address)
+    scenario += dao.post_curation_root(_round = 1, _root = sp.bytes("0x00")).run(sender = admin, valid = False)
+
+    scenario.h2("Minting with proofs")
+    scenario += dao.art_mint_with_proof(_round = 2, _art_proposal_id = 1, _proof = proof(1)).run(sender = alice, valid = False)
+    scenario += dao.art_mint_with_proof(_round = 1, _art_proposal_id = 2, _proof = proof(1)).run(sender = charles, valid = False)
+    scenario += dao.art_mint_with_proof(_round = 1, _art_proposal_id = 1, _proof = proof(1)).run(sender = charles, valid = False)
+    scenario += dao.art_mint_with_proof(_round = 1, _art_proposal_id = 1, _proof = proof(1)).run(sender = alice)
+    scenario += dao.art_mint_with_proof(_round = 1, _art_proposal_id = 3, _proof = proof(3)).run(sender = alice)
+    scenario += dao.art_mint_with_proof(_round = 1, _art_proposal_id = 1, _proof = proof(1)).run(sender = alice, valid = False)
+    scenario.verify(nft.data.ledger[nft.ledger_key.make(alice.address, 0)].balance == 3)
+    scenario.verify(nft.data.ledger[nft.ledger_key.make(alice.address, 1)].balance == 1)
+
+
+@sp.add_test(name="main-VoteGas", is_default=False)
+def test():
+    scenario = sp.test_scenario()
+    scenario.h1("Per-vote gas as the number of proposals grows")
+    scenario.p("A curator votes on the newest proposal after 10, 1k and 5k proposals have been made, once with regular maps and once with big_maps. Scenarios don't report gas: the curation_vote_on_artproposal_*_proposals cases of benchmark.py measure the vote at the same sizes and layouts, with `python bench_report.py`.")
+    scenario.table_of_contents()
+
+    alice = sp.test_account("alice")
+    bob = sp.test_account("bob")
+
+    def proposal(artist):
+        return sp.record(artist = artist, art_metadata = sp.bytes("0xdaad"), price = sp.nat(5), editions = sp.nat(3), mint_index = sp.nat(0), time_of_creation = sp.timestamp(0), time_of_expiration = sp.timestamp(28), votes_in_favour = sp.nat(0), votes_in_against = sp.nat(0), is_minted = False)
+
+    for size in [10, 1000, 5000]:
+        for lazy_storage in [False, True]:
+            scenario.h2("%d proposals, %s" % (size, "big_map" if lazy_storage else "map"))
+            if lazy_storage:
+                my_map = sp.big_map
+            else:
+                my_map = sp.map
+            dao = MainContract(lazy_storage = lazy_storage)
+            dao.update_initial_storage(
+                curators = sp.set([bob.address], t = sp.TAddress),
+                profile = my_map(l = {alice.address: sp.bytes("0x30"), bob.address: sp.bytes("0x31")}, tkey = sp.TAddress, tvalue = sp.TBytes),
+                art_proposal_ids = my_map(l = {alice.address: sp.set(range(1, size + 1), t = sp.TNat)}, tkey = sp.TAddress, tvalue = sp.TSet(t = sp.TNat)),
+                art_proposal_details = my_map(l = dict([(i, proposal(alice.address)) for i in range(1, size + 1)]), tkey = sp.TNat, tvalue = ArtProposal().get_type()),
+                art_proposal_counter = sp.nat(size),
+            )
+            scenario += dao
+            scenario.h3("vote_on_artproposal")
+            scenario += dao.vote_on_artproposal(size).run(sender = bob, now = sp.timestamp(20))
+            scenario.h3("vote_against_artproposal")
+            scenario += dao.vote_against_artproposal(1).run(sender = bob, now = sp.timestamp(20))
@@ -9,6 +9,8 @@
 # <https://assets.tqtezos.com/docs/token-contracts/fa2/1-fa2-smartpy/>.
 ##
 import smartpy as sp
+
+events = sp.io.import_stored_contract('events.py')
 ##
 # Meta-Programming Configuration
 ##
@@ -29,7 +31,10 @@ class FA2_config:
                  store_total_supply=True,
                  lazy_entry_points=False,
                  allow_self_transfer=False,
-                 use_token_metadata_offchain_view=False
+                 use_token_metadata_offchain_view=False,
+                 dedup_token_metadata=False,
+                 nft_ledger=False,
+                 remove_zero_balances=False
                  ):
 
         if debug_mode:
@@ -43,6 +48,33 @@ class FA2_config:
         self.use_token_metadata_offchain_view = use_token_metadata_offchain_view
         # Include offchain view for accessing the token metadata (requires TZIP-016 contract metadata)
 
+        self.dedup_token_metadata = dedup_token_metadata
+        # Store each distinct `token_info` map once, under the BLAKE2B hash
+        # of its packed value, and only a reference to it per token:
+        # `token_metadata_refs: token-id -> hash` and
+        # `token_metadata_blobs: hash -> token_info`. Editions and series
+        # sharing their metadata then pay for it once. The standard
+        # `token_metadata` big-map is not stored any more, so this requires
+        # the `token_metadata` off-chain view, which keeps returning the
+        # same records.
+        if dedup_token_metadata:
+            assert use_token_metadata_offchain_view, "dedup_token_metadata requires use_token_metadata_offchain_view"
+
+        self.nft_ledger = nft_ledger
+        # Key the ledger by token-id only and store the owner:
+        # `token-id -> owner-address`. A transfer then updates a single
+        # entry and never leaves zero-balance rows behind. Every token has
+        # a supply of exactly 1, so this requires `non_fungible`.
+        if nft_ledger:
+            assert non_fungible and not single_asset, "nft_ledger requires non_fungible"
+
+        self.remove_zero_balances = remove_zero_balances
+        # Delete a ledger entry in `transfer` when its balance drops to 0
+        # instead of keeping a dead row; `balance_of` and `get_balance`
+        # treat a missing entry as a 0 balance. Independently of this
+        # option, the administrator can delete existing zero rows with the
+        # `remove_zero_balances` entry-point (not needed with `nft_ledger`).
+
         self.single_asset = single_asset
         # This makes the contract save some gas and storage by
         # working only for the token-id `0`.
@@ -118,6 +150,12 @@ class FA2_config:
             name += "-lep"
         if allow_self_transfer:
             name += "-self_transfer"
+        if dedup_token_metadata:
+            name += "-dedup_meta"
+        if nft_ledger:
+            name += "-nft_ledger"
+        if remove_zero_balances:
+            name += "-rm_zero"
         self.name = name
 
 
@@ -287,6 +325,46 @@ class Operator_set:
     def is_member(self, set, owner, operator, token_id):
         return set.contains(self.make_key(owner, operator, token_id))
 
+# Operators approved for all the tokens of an owner are kept in their own
+# lazy set of `(owner × operator)` values, so that a single approval covers
+# a whole collection, including tokens minted later.
+
+
+class Operator_for_all_set:
+    def __init__(self, config):
+        self.config = config
+
+    def inner_type(self):
+        return sp.TRecord(owner=sp.TAddress,
+                          operator=sp.TAddress
+                          ).layout(("owner", "operator"))
+
+    def key_type(self):
+        if self.config.readable:
+            return self.inner_type()
+        else:
+            return sp.TBytes
+
+    def make(self):
+        return self.config.my_map(tkey=self.key_type(), tvalue=sp.TUnit)
+
+    def make_key(self, owner, operator):
+        metakey = sp.set_type_expr(sp.record(owner=owner, operator=operator),
+                                   self.inner_type())
+        if self.config.readable:
+            return metakey
+        else:
+            return sp.pack(metakey)
+
+    def add(self, set, owner, operator):
+        set[self.make_key(owner, operator)] = sp.unit
+
+    def remove(self, set, owner, operator):
+        del set[self.make_key(owner, operator)]
+
+    def is_member(self, set, owner, operator):
+        return set.contains(self.make_key(owner, operator))
+
 
 class Balance_of:
     def request_type():
@@ -368,6 +446,21 @@ def mutez_transfer(contract, params):
     sp.set_type(params.destination, sp.TAddress)
     sp.set_type(params.amount, sp.TMutez)
     sp.send(params.destination, params.amount)
+
+
+def remove_zero_balances(contract, params):
+    # Deletes the given ledger entries whose balance is 0; entries that
+    # are missing or still hold tokens are left alone.
+    sp.set_type(params, sp.TList(
+        sp.TRecord(owner=sp.TAddress, token_id=token_id_type).layout(
+            ("owner", "token_id"))))
+    sp.verify(contract.is_administrator(sp.sender),
+              message=contract.error_message.not_admin())
+    sp.for entry in params:
+        user = contract.ledger_key.make(entry.owner, entry.token_id)
+        sp.if contract.data.ledger.get(
+                user, default_value=Ledger_value.make(1)).balance == 0:
+            del contract.data.ledger[user]
 ##
 # The `FA2` class builds a contract according to an `FA2_config` and an
 # administrator address.
@@ -390,6 +483,7 @@ class FA2_core(sp.Contract):
         self.config = config
         self.error_message = Error_message(self.config)
         self.operator_set = Operator_set(self.config)
+        self.operator_for_all_set = Operator_for_all_set(self.config)
         self.operator_param = Operator_param(self.config)
         self.token_id_set = Token_id_set(self.config)
         self.ledger_key = Ledger_key(self.config)
@@ -397,20 +491,38 @@ class FA2_core(sp.Contract):
         self.batch_transfer = Batch_transfer(self.config)
         if self.config.add_mutez_transfer:
             self.transfer_mutez = sp.entry_point(mutez_transfer)
+        if not self.config.nft_ledger:
+            self.remove_zero_balances = sp.entry_point(remove_zero_balances)
         if config.lazy_entry_points:
             self.add_flag("lazy-entry-points")
         self.add_flag("initial-cast")
         self.exception_optimization_level = "default-line"
+        if self.config.nft_ledger:
+            ledger = self.config.my_map(tkey=token_id_type, tvalue=sp.TAddress)
+        else:
+            ledger = self.config.my_map(tvalue=Ledger_value.get_type())
         self.init(
-            ledger=self.config.my_map(tvalue=Ledger_value.get_type()),
-            token_metadata=self.config.my_map(
-                tkey=sp.TNat, tvalue=self.token_meta_data.get_type()),
+            ledger=ledger,
             operators=self.operator_set.make(),
+            operators_for_all=self.operator_for_all_set.make(),
             all_tokens=self.token_id_set.empty(),
             metadata=metadata,
             **extra_storage
         )
 
+        if self.config.dedup_token_metadata:
+            self.update_initial_storage(
+                token_metadata_refs=self.config.my_map(
+                    tkey=sp.TNat, tvalue=sp.TBytes),
+                token_metadata_blobs=self.config.my_map(
+                    tkey=sp.TBytes, tvalue=sp.TMap(sp.TString, sp.TBytes)),
+            )
+        else:
+            self.update_initial_storage(
+                token_metadata=self.config.my_map(
+                    tkey=sp.TNat, tvalue=self.token_meta_data.get_type()),
+            )
+
         if self.config.store_total_supply:
             self.update_initial_storage(
                 total_supply=self.config.my_map(tkey=sp.TNat, tvalue=sp.TNat),
@@ -438,25 +550,54 @@ class FA2_core(sp.Contract):
                                                                   tx.token_id))
                 if self.config.allow_self_transfer:
                     sender_verify |= (sp.sender == sp.self_address)
+                if self.config.support_operator:
+                    # Collection-wide operators are only looked up when the
+                    # other checks fail, so that transfers by the owner or by
+                    # a per-token operator don't pay for the extra read.
+                    allowed = sp.local("allowed", sender_verify)
+                    sp.if ~allowed.value:
+                        allowed.value = self.operator_for_all_set.is_member(self.data.operators_for_all,
+                                                                            current_from,
+                                                                            sp.sender)
+                    sender_verify = allowed.value
                 sp.verify(sender_verify, message=message)
                 sp.verify(
-                    self.data.token_metadata.contains(tx.token_id),
+                    self.token_exists(tx.token_id),
                     message=self.error_message.token_undefined()
                 )
                 # If amount is 0 we do nothing now:
                 sp.if (tx.amount > 0):
-                    from_user = self.ledger_key.make(current_from, tx.token_id)
-                    sp.verify(
-                        (self.data.ledger[from_user].balance >= tx.amount),
-                        message=self.error_message.insufficient_balance())
-                    to_user = self.ledger_key.make(tx.to_, tx.token_id)
-                    self.data.ledger[from_user].balance = sp.as_nat(
-                        self.data.ledger[from_user].balance - tx.amount)
-                    sp.if self.data.ledger.contains(to_user):
-                        self.data.ledger[to_user].balance += tx.amount
-                    sp.else:
-                        self.data.ledger[to_user] = Ledger_value.make(
-                            tx.amount)
+                    if self.config.nft_ledger:
+                        sp.verify(
+                            (tx.amount == 1) &
+                            (self.data.ledger[tx.token_id] == current_from),
+                            message=self.error_message.insufficient_balance())
+                        self.data.ledger[tx.token_id] = tx.to_
+                    else:
+                        from_user = self.ledger_key.make(current_from, tx.token_id)
+                        sp.verify(
+                            (self.data.ledger[from_user].balance >= tx.amount),
+                            message=self.error_message.insufficient_balance())
+                        to_user = self.ledger_key.make(tx.to_, tx.token_id)
+                        if self.config.remove_zero_balances:
+                            remaining = sp.local("remaining", sp.as_nat(
+                                self.data.ledger[from_user].balance - tx.amount))
+                            sp.if remaining.value == 0:
+                                del self.data.ledger[from_user]
+                            sp.else:
+                                self.data.ledger[from_user].balance = remaining.value
+                        else:
+                            self.data.ledger[from_user].balance = sp.as_nat(
+                                self.data.ledger[from_user].balance - tx.amount)
+                        sp.if self.data.ledger.contains(to_user):
+                            self.data.ledger[to_user].balance += tx.amount
+                        sp.else:
+                            self.data.ledger[to_user] = Ledger_value.make(
+                                tx.amount)
+                    events.TRANSFER.emit(from_=current_from,
+                                         to_=tx.to_,
+                                         token_id=tx.token_id,
+                                         amount=tx.amount)
                 sp.else:
                     pass
 
@@ -467,24 +608,32 @@ class FA2_core(sp.Contract):
         sp.set_type(params, Balance_of.entry_point_type())
 
         def f_process_request(req):
-            user = self.ledger_key.make(req.owner, req.token_id)
-            sp.verify(self.data.token_metadata.contains(req.token_id),
+            sp.verify(self.token_exists(req.token_id),
                       message=self.error_message.token_undefined())
-            sp.if self.data.ledger.contains(user):
-                balance = self.data.ledger[user].balance
+            if self.config.nft_ledger:
                 sp.result(
                     sp.record(
                         request=sp.record(
                             owner=sp.set_type_expr(req.owner, sp.TAddress),
                             token_id=sp.set_type_expr(req.token_id, sp.TNat)),
-                        balance=balance))
-            sp.else:
-                sp.result(
-                    sp.record(
-                        request=sp.record(
-                            owner=sp.set_type_expr(req.owner, sp.TAddress),
-                            token_id=sp.set_type_expr(req.token_id, sp.TNat)),
-                        balance=0))
+                        balance=self.nft_balance(req.owner, req.token_id)))
+            else:
+                user = self.ledger_key.make(req.owner, req.token_id)
+                sp.if self.data.ledger.contains(user):
+                    balance = self.data.ledger[user].balance
+                    sp.result(
+                        sp.record(
+                            request=sp.record(
+                                owner=sp.set_type_expr(req.owner, sp.TAddress),
+                                token_id=sp.set_type_expr(req.token_id, sp.TNat)),
+                            balance=balance))
+                sp.else:
+                    sp.result(
+                        sp.record(
+                            request=sp.record(
+                                owner=sp.set_type_expr(req.owner, sp.TAddress),
+                                token_id=sp.set_type_expr(req.token_id, sp.TNat)),
+                            balance=0))
         res = sp.local("responses", params.requests.map(f_process_request))
         destination = sp.set_type_expr(
             params.callback, sp.TContract(Balance_of.response_type()))
@@ -498,10 +647,14 @@ class FA2_core(sp.Contract):
                 owner=sp.TAddress,
                 token_id=sp.TNat
             ).layout(("owner", "token_id")))
-        user = self.ledger_key.make(req.owner, req.token_id)
-        sp.verify(self.data.token_metadata.contains(req.token_id),
+        sp.verify(self.token_exists(req.token_id),
                   message=self.error_message.token_undefined())
-        sp.result(self.data.ledger[user].balance)
+        if self.config.nft_ledger:
+            sp.result(self.nft_balance(req.owner, req.token_id))
+        else:
+            user = self.ledger_key.make(req.owner, req.token_id)
+            sp.result(self.data.ledger.get(
+                user, default_value=Ledger_value.make(0)).balance)
 
     @sp.entry_point
     def update_operators(self, params):
@@ -524,6 +677,9 @@ class FA2_core(sp.Contract):
                                               upd.owner,
                                               upd.operator,
                                               upd.token_id)
+                        events.OPERATOR_ADDED.emit(owner=upd.owner,
+                                                   operator=upd.operator,
+                                                   token_id=upd.token_id)
                     with arg.match("remove_operator") as upd:
                         sp.verify(
                             (upd.owner == sp.sender) | self.is_administrator(
@@ -534,9 +690,71 @@ class FA2_core(sp.Contract):
                                                  upd.owner,
                                                  upd.operator,
                                                  upd.token_id)
+                        events.OPERATOR_REMOVED.emit(owner=upd.owner,
+                                                     operator=upd.operator,
+                                                     token_id=upd.token_id)
+        else:
+            sp.failwith(self.error_message.operators_unsupported())
+
+    @sp.entry_point
+    def update_operators_for_all(self, params):
+        # Not part of TZIP-12, which keeps `update_operators` unchanged: the
+        # approvals made here apply to every token of the owner.
+        sp.set_type(params, sp.TList(
+            sp.TVariant(
+                add_operator_for_all=self.operator_for_all_set.inner_type(),
+                remove_operator_for_all=self.operator_for_all_set.inner_type()
+            )
+        ))
+        if self.config.support_operator:
+            sp.for update in params:
+                with update.match_cases() as arg:
+                    with arg.match("add_operator_for_all") as upd:
+                        sp.verify(
+                            (upd.owner == sp.sender) | self.is_administrator(
+                                sp.sender),
+                            message=self.error_message.not_admin_or_operator()
+                        )
+                        self.operator_for_all_set.add(self.data.operators_for_all,
+                                                      upd.owner,
+                                                      upd.operator)
+                        events.OPERATOR_FOR_ALL_ADDED.emit(owner=upd.owner,
+                                                           operator=upd.operator)
+                    with arg.match("remove_operator_for_all") as upd:
+                        sp.verify(
+                            (upd.owner == sp.sender) | self.is_administrator(
+                                sp.sender),
+                            message=self.error_message.not_admin_or_operator()
+                        )
+                        self.operator_for_all_set.remove(self.data.operators_for_all,
+                                                         upd.owner,
+                                                         upd.operator)
+                        events.OPERATOR_FOR_ALL_REMOVED.emit(owner=upd.owner,
+                                                             operator=upd.operator)
         else:
             sp.failwith(self.error_message.operators_unsupported())
 
+    def nft_balance(self, owner, token_id):
+        # With `nft_ledger`, every existing token has exactly one owner.
+        return sp.eif(self.data.ledger[token_id] == owner, sp.nat(1), sp.nat(0))
+
+    def token_exists(self, token_id):
+        if self.config.dedup_token_metadata:
+            return self.data.token_metadata_refs.contains(token_id)
+        return self.data.token_metadata.contains(token_id)
+
+    def set_token_metadata(self, token_id, token_info):
+        if self.config.dedup_token_metadata:
+            info_hash = sp.local("info_hash", sp.blake2b(sp.pack(token_info)))
+            sp.if ~ self.data.token_metadata_blobs.contains(info_hash.value):
+                self.data.token_metadata_blobs[info_hash.value] = token_info
+            self.data.token_metadata_refs[token_id] = info_hash.value
+        else:
+            self.data.token_metadata[token_id] = sp.record(
+                token_id=token_id,
+                token_info=token_info
+            )
+
     # this is not part of the standard but can be supported through inheritance.
     def is_paused(self):
         return sp.bool(False)
@@ -555,6 +773,7 @@ class FA2_administrator(FA2_core):
         sp.verify(self.is_administrator(sp.sender),
                   message=self.error_message.not_admin())
         self.data.administrator = params
+        events.ADMINISTRATOR_SET.emit(administrator=params)
 
 
 class FA2_pause(FA2_core):
@@ -566,6 +785,7 @@ class FA2_pause(FA2_core):
         sp.verify(self.is_administrator(sp.sender),
                   message=self.error_message.not_admin())
         self.data.paused = params
+        events.PAUSE_SET.emit(pause=params)
 
 
 class FA2_change_metadata(FA2_core):
@@ -574,16 +794,21 @@ class FA2_change_metadata(FA2_core):
         sp.verify(self.is_administrator(sp.sender),
                   message=self.error_message.not_admin())
         self.data.metadata[k] = v
+        events.METADATA_SET.emit(key=k, value=v)
 
 
 class FA2_mint(FA2_core):
-    @sp.entry_point
-    def mint(self, params):
-        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
-        # We don't check for pauseness because we're the admin.
+    def mint_type(self):
+        return sp.TRecord(token_id=token_id_type,
+                          address=sp.TAddress,
+                          amount=sp.TNat,
+                          metadata=sp.TMap(sp.TString, sp.TBytes))
+
+    def mint_token(self, params):
         if self.config.single_asset:
             sp.verify(params.token_id == 0,
                       message="single-asset: token-id <> 0")
+        user = self.ledger_key.make(params.address, params.token_id)
         if self.config.non_fungible:
             # sp.verify( message = "NFT-asset")
             sp.verify(
@@ -591,20 +816,45 @@ class FA2_mint(FA2_core):
                     self.data.all_tokens, params.token_id),
                 message="NFT-asset: cannot mint twice same token"
             )
-        user = self.ledger_key.make(params.address, params.token_id)
-        sp.if self.data.ledger.contains(user):
-            self.data.ledger[user].balance += params.amount
-        sp.else:
-            self.data.ledger[user] = Ledger_value.make(params.amount)
-        sp.if ~ self.token_id_set.contains(self.data.all_tokens, params.token_id):
+            # The token is known to be new, so neither the ledger nor the
+            # set of tokens needs to be checked again.
+            if self.config.nft_ledger:
+                sp.verify(params.amount == 1,
+                          message="NFT-asset: amount <> 1")
+                self.data.ledger[params.token_id] = params.address
+            else:
+                self.data.ledger[user] = Ledger_value.make(params.amount)
             self.token_id_set.add(self.data.all_tokens, params.token_id)
-            self.data.token_metadata[params.token_id] = sp.record(
-                token_id=params.token_id,
-                token_info=params.metadata
-            )
+            self.set_token_metadata(params.token_id, params.metadata)
+        else:
+            sp.if self.data.ledger.contains(user):
+                self.data.ledger[user].balance += params.amount
+            sp.else:
+                self.data.ledger[user] = Ledger_value.make(params.amount)
+            sp.if ~ self.token_id_set.contains(self.data.all_tokens, params.token_id):
+                self.token_id_set.add(self.data.all_tokens, params.token_id)
+                self.set_token_metadata(params.token_id, params.metadata)
         if self.config.store_total_supply:
             self.data.total_supply[params.token_id] = params.amount + \
                 self.data.total_supply.get(params.token_id, default_value=0)
+        events.MINT.emit(token_id=params.token_id,
+                         address=params.address,
+                         amount=params.amount,
+                         token_info=params.metadata)
+
+    @sp.entry_point
+    def mint(self, params):
+        sp.set_type(params, self.mint_type())
+        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+        # We don't check for pauseness because we're the admin.
+        self.mint_token(params)
+
+    @sp.entry_point
+    def mint_batch(self, params):
+        sp.set_type(params, sp.TList(self.mint_type()))
+        sp.verify(self.is_administrator(sp.sender), message = self.error_message.not_admin())
+        sp.for item in params:
+            self.mint_token(item)
 
 
 class FA2_token_metadata(FA2_core):
@@ -617,7 +867,13 @@ class FA2_token_metadata(FA2_core):
             most flexible choice.
             """
             sp.set_type(tok, sp.TNat)
-            sp.result(self.data.token_metadata[tok])
+            if self.config.dedup_token_metadata:
+                sp.result(sp.set_type_expr(
+                    sp.record(token_id=tok,
+                              token_info=self.data.token_metadata_blobs[self.data.token_metadata_refs[tok]]),
+                    self.token_meta_data.get_type()))
+            else:
+                sp.result(self.data.token_metadata[tok])
 
         self.token_metadata = sp.offchain_view(
             pure=True, doc="Get Token Metadata")(token_metadata)
@@ -644,7 +900,7 @@ class FA2(FA2_change_metadata, FA2_token_metadata, FA2_mint, FA2_administrator,
     def does_token_exist(self, tok):
         "Ask whether a token ID is exists."
         sp.set_type(tok, sp.TNat)
-        sp.result(self.data.token_metadata.contains(tok))
+        sp.result(self.token_exists(tok))
 
     @sp.offchain_view(pure=True)
     def all_tokens(self):
@@ -668,12 +924,16 @@ class FA2(FA2_change_metadata, FA2_token_metadata, FA2_mint, FA2_administrator,
                                owner=sp.TAddress,
                                operator=sp.TAddress).layout(
                                    ("owner", ("operator", "token_id"))))
-        sp.result(
-            self.operator_set.is_member(self.data.operators,
-                                        query.owner,
-                                        query.operator,
-                                        query.token_id)
-        )
+        is_operator = sp.local("is_operator",
+                               self.operator_set.is_member(self.data.operators,
+                                                           query.owner,
+                                                           query.operator,
+                                                           query.token_id))
+        sp.if ~is_operator.value:
+            is_operator.value = self.operator_for_all_set.is_member(self.data.operators_for_all,
+                                                                    query.owner,
+                                                                    query.operator)
+        sp.result(is_operator.value)
 
     def __init__(self, config, metadata, admin):
         # Let's show off some meta-programming:
@@ -848,6 +1108,27 @@ def add_test(config, is_default=True):
                 amount=200,
                 metadata=tok2_md,
                 token_id=3).run(sender=admin)
+        scenario.h2("Batch Minting")
+        scenario.p("The administrator mints tokens 4 and 5 in one call.")
+        c1.mint_batch([
+            sp.record(address=alice.address,
+                      amount=1,
+                      metadata=tok0_md,
+                      token_id=4),
+            sp.record(address=bob.address,
+                      amount=1,
+                      metadata=tok0_md,
+                      token_id=5)]).run(sender=admin)
+        c1.mint_batch([
+            sp.record(address=alice.address,
+                      amount=1,
+                      metadata=tok0_md,
+                      token_id=6)]).run(sender=alice, valid=False)
+        if config.dedup_token_metadata:
+            scenario.p("Tokens 0, 4 and 5 share their metadata, which is stored once.")
+            scenario.verify(c1.data.token_metadata_refs[4] == c1.data.token_metadata_refs[0])
+            scenario.verify(c1.data.token_metadata_refs[5] == c1.data.token_metadata_refs[0])
+            scenario.verify(c1.token_metadata(5).token_info == tok0_md)
         # scenario.h3("Multi-token Transfer Bob -> Alice")
         # c1.transfer(
         #     [
@@ -1080,8 +1361,95 @@ def add_test(config, is_default=True):
                                                          amount=1,
                                                          token_id=0)])
                 ]).run(sender=op2)
+            scenario.h3("Operators for all tokens")
+            scenario.p("Operator2 cannot transfer Bob's 2-tokens yet.")
+            tokens_2_and_3 = [
+                c1.batch_transfer.item(from_=bob.address,
+                                       txs=[
+                                           sp.record(to_=alice.address,
+                                                     amount=1,
+                                                     token_id=2),
+                                           sp.record(to_=alice.address,
+                                                     amount=1,
+                                                     token_id=3)])
+            ]
+            c1.transfer(tokens_2_and_3).run(sender=op2, valid=False)
+            scenario.p("Alice cannot approve an operator for all of Bob's tokens.")
+            c1.update_operators_for_all([
+                sp.variant("add_operator_for_all", sp.record(owner=bob.address,
+                                                             operator=op2.address))
+            ]).run(sender=alice, valid=False)
+            scenario.p("Bob approves Operator2 for all their tokens with a single entry.")
+            c1.update_operators_for_all([
+                sp.variant("add_operator_for_all", sp.record(owner=bob.address,
+                                                             operator=op2.address))
+            ]).run(sender=bob)
+            scenario.verify(c1.is_operator(sp.record(owner=bob.address,
+                                                     operator=op2.address,
+                                                     token_id=3)))
+            c1.transfer(tokens_2_and_3).run(sender=op2)
+            scenario.p("Once removed, Operator2 cannot transfer them any more.")
+            c1.update_operators_for_all([
+                sp.variant("remove_operator_for_all", sp.record(owner=bob.address,
+                                                                operator=op2.address))
+            ]).run(sender=bob)
+            c1.transfer(tokens_2_and_3).run(sender=op2, valid=False)
             scenario.table_of_contents()
 
+
+def add_ledger_layout_test(is_default=False):
+    @sp.add_test(name="FA2-ledger-layouts", is_default=is_default)
+    def test():
+        scenario = sp.test_scenario()
+        scenario.h1("NFT ledger layouts")
+        scenario.p("The same mints and transfers run against the default (owner, token-id) -> balance ledger and the nft_ledger token-id -> owner one. With nft_ledger a transfer rewrites one entry and leaves no zero-balance row behind, with remove_zero_balances the emptied row is deleted by the transfer itself, and otherwise it stays until the administrator removes it. Scenarios don't report gas: the fa2_transfer_holders, fa2_nft_ledger_transfer_holders, fa2_remove_zero_transfer_holders and fa2_remove_zero_balances_rows cases of benchmark.py measure these calls, with `python bench_report.py`.")
+        scenario.table_of_contents()
+        admin = sp.test_account("Administrator")
+        alice = sp.test_account("Alice")
+        bob = sp.test_account("Robert")
+        md = FA2.make_metadata(name="NFT", decimals=0, symbol="NFT")
+        for nft_ledger, remove_zero in [(False, False), (False, True), (True, False)]:
+            config = FA2_config(store_total_supply=False,
+                                use_token_metadata_offchain_view=True,
+                                nft_ledger=nft_ledger,
+                                remove_zero_balances=remove_zero)
+            scenario.h2(config.name)
+            c1 = FA2(config=config,
+                     metadata=sp.utils.metadata_of_url("https://example.com"),
+                     admin=admin.address)
+            scenario += c1
+            scenario.h3("Mint")
+            c1.mint_batch([sp.record(address=alice.address, amount=1, metadata=md, token_id=i)
+                           for i in range(3)]).run(sender=admin)
+            scenario.h3("Transfer Alice -> Bob")
+            c1.transfer([c1.batch_transfer.item(from_=alice.address,
+                                                txs=[sp.record(to_=bob.address, amount=1, token_id=0)])]).run(sender=alice)
+            scenario.h3("Transfer Bob -> Alice")
+            c1.transfer([c1.batch_transfer.item(from_=bob.address,
+                                                txs=[sp.record(to_=alice.address, amount=1, token_id=0)])]).run(sender=bob)
+            scenario.h3("Invalid transfers")
+            c1.transfer([c1.batch_transfer.item(from_=bob.address,
+                                                txs=[sp.record(to_=alice.address, amount=1, token_id=0)])]).run(sender=bob, valid=False)
+            c1.transfer([c1.batch_transfer.item(from_=alice.address,
+                                                txs=[sp.record(to_=bob.address, amount=2, token_id=1)])]).run(sender=alice, valid=False)
+            scenario.verify(c1.get_balance(sp.record(owner=alice.address, token_id=0)) == 1)
+            scenario.verify(c1.get_balance(sp.record(owner=bob.address, token_id=0)) == 0)
+            if not nft_ledger:
+                bob_0 = c1.ledger_key.make(bob.address, 0)
+                if remove_zero:
+                    scenario.verify(~ c1.data.ledger.contains(bob_0))
+                else:
+                    scenario.verify(c1.data.ledger.contains(bob_0))
+                scenario.h3("Remove zero balances")
+                rows = [sp.record(owner=bob.address, token_id=0),
+                        sp.record(owner=alice.address, token_id=1)]
+                c1.remove_zero_balances(rows).run(sender=bob, valid=False)
+                c1.remove_zero_balances(rows).run(sender=admin)
+                scenario.verify(~ c1.data.ledger.contains(bob_0))
+                scenario.verify(c1.get_balance(sp.record(owner=alice.address, token_id=1)) == 1)
+            scenario.h3("Ledger")
+            scenario.show(c1.data.ledger)
+
 ##
 # Global Environment Parameters
 ##
@@ -1118,6 +1486,9 @@ def environment_config():
         allow_self_transfer=global_parameter("allow_self_transfer", False),
         use_token_metadata_offchain_view=global_parameter(
             "use_token_metadata_offchain_view", True),
+        dedup_token_metadata=global_parameter("dedup_token_metadata", False),
+        nft_ledger=global_parameter("nft_ledger", False),
+        remove_zero_balances=global_parameter("remove_zero_balances", False),
     )
 
 
@@ -1127,6 +1498,9 @@ def environment_config():
 # for the browser version.
 if "templates" not in __name__:
     add_test(environment_config())
+    add_test(FA2_config(use_token_metadata_offchain_view=True,
+                        dedup_token_metadata=True), is_default=False)
+    add_ledger_layout_test()
 
     sp.add_compilation_target("FA2_comp", FA2(config=environment_config(),
                               metadata=sp.utils.metadata_of_url(
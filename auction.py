@@ -1,10 +1,14 @@
 import smartpy as sp
 
+events = sp.io.import_stored_contract('events.py')
+creator_index = sp.io.import_stored_contract('creator_index.py')
+
 class Share:
     def get_type(self):
         t = sp.TRecord(
             recipient=sp.TAddress,
             amount=sp.TNat)
+        return t
 
     def make(self, recipient, amount):
         r = sp.record(
@@ -25,7 +29,7 @@ class AuctionData:
             price_increment = sp.TMutez,
             current_price = sp.TMutez,
             highest_bidder = sp.TAddress,
-            shares = Share().get_type()
+            split_id = sp.TNat
         )
     
     def get_type(self): return self.type_value
@@ -41,7 +45,7 @@ class AuctionData:
             price_increment = _params.price_increment,
             current_price = _params.current_price,
             highest_bidder = _params.highest_bidder,
-            shares = _params.shares
+            split_id = _params.split_id
         )
 
 class Batch_transfer:
@@ -64,14 +68,21 @@ class Batch_transfer:
 
 class Auction(sp.Contract):
     def __init__(self, mods, fund_operator):
+        self.creator_index = creator_index.Creator_index()
         self.init(
             # metadata = metadata,
             mods = sp.set(mods),
             fund_operator = fund_operator,
             next_auction_id = sp.nat(0),
             auctions = AuctionData().set_type(),
+            auctions_by_creator = self.creator_index.make(),
             platform_fees = sp.nat(20000),
-            pause = sp.bool(False)
+            balances = sp.big_map(l = {}, tkey = sp.TAddress, tvalue = sp.TMutez),
+            pause = sp.bool(False),
+            # Royalty splits registered with `register_split`, referenced by id
+            # from auctions. Split 0 pays no royalties.
+            splits = sp.big_map(l = {0: []}, tkey = sp.TNat, tvalue = sp.TList(Share().get_type())),
+            next_split_id = sp.nat(1)
         )
         
     def transfer_token(self, contract, params_):
@@ -102,12 +113,28 @@ class Auction(sp.Contract):
             .layout(("from_", "txs"))), contract, entry_point="transfer").open_some()
         sp.transfer(params_, sp.mutez(0), contractParams)
     
+    def add_payout(self, payouts, recipient, amount):
+        payouts.value[recipient] = payouts.value.get(recipient, default_value = sp.mutez(0)) + amount
+
+    def credit(self, recipient, amount):
+        # Refunds and proceeds are credited to a withdrawable balance rather
+        # than sent inline, so a recipient contract that rejects tez cannot
+        # block a bid or a sale.
+        sp.if amount > sp.mutez(0):
+            self.data.balances[recipient] = self.data.balances.get(recipient, default_value = sp.mutez(0)) + amount
+            events.BALANCE_CREDITED.emit(recipient = recipient, amount = amount)
+
+    def credit_payouts(self, payouts):
+        # One balance update per recipient, however many shares they hold.
+        sp.for payout in payouts.value.items():
+            self.credit(payout.key, payout.value)
+
     @sp.entry_point
     def add_moderator(self, _moderator):
         sp.set_type(_moderator, sp.TAddress)
         sp.verify(self.data.mods.contains(sp.sender), "NOT_MODERATOR")
         self.data.mods.add(_moderator)
-        sp.emit(sp.record(moderator=_moderator),tag="MODERATOR_ADDED")
+        events.MODERATOR_ADDED.emit(moderator = _moderator)
         
     @sp.entry_point
     def remove_moderator(self, _moderator):
@@ -115,7 +142,7 @@ class Auction(sp.Contract):
         sp.verify(self.data.mods.contains(sp.sender), "NOT_MODERATOR")
         sp.verify(self.data.mods.contains(_moderator), "ADDRESS_NAT_MODERATOR")
         self.data.mods.remove(_moderator)
-        sp.emit(sp.record(moderator=_moderator),tag="MODERATOR_REMOVED")
+        events.MODERATOR_REMOVED.emit(moderator = _moderator)
     
     @sp.entry_point
     def update_platform_fees(self, platform_fees):
@@ -123,17 +150,36 @@ class Auction(sp.Contract):
         sp.verify(self.data.mods.contains(sp.sender), "NOT_MODERATOR")
         sp.verify(platform_fees < 1000000, "INVALID_SHARES")
         self.data.platform_fees = platform_fees
-        sp.emit(sp.record(platform_fees=platform_fees),tag="UPDATE_PLATFORM_FEES")
+        events.UPDATE_PLATFORM_FEES.emit(platform_fees = platform_fees)
         
     @sp.entry_point
-    def create_auction(self, _params):
-        sp.set_type(_params, AuctionData().get_type())
-        sp.verify(_params.creator == sp.sender, "INVALID_CREATOR")
+    def register_split(self, shares):
+        # Splits can't be changed once registered, so their shares are only
+        # checked here and any auction can reference them by id.
+        sp.set_type(shares, sp.TList(Share().get_type()))
         total_shares = sp.local("total_shares", self.data.platform_fees)
-        sp.for txn in _params.shares:
+        sp.for txn in shares:
             total_shares.value += txn.amount
         sp.verify(total_shares.value < 1000000, "INVALID_SHARES")
+        self.data.splits[self.data.next_split_id] = shares
+        events.SPLIT_REGISTERED.emit(split_id = self.data.next_split_id, shares = shares)
+        self.data.next_split_id += 1
+
+    @sp.entry_point
+    def create_auction(self, _params):
+        sp.set_type(_params, AuctionData().get_type())
+        sp.verify(_params.creator == sp.sender, "INVALID_CREATOR")
+        sp.verify(self.data.splits.contains(_params.split_id), "INVALID_SPLIT_ID")
         self.data.auctions[self.data.next_auction_id] = AuctionData().set_value(_params)
+        self.creator_index.add(self.data.auctions_by_creator, _params.creator, self.data.next_auction_id)
+        events.AUCTION_CREATED.emit(auction_id = self.data.next_auction_id,
+                                    creator = _params.creator,
+                                    token = _params.token,
+                                    start_time = _params.start_time,
+                                    end_time = _params.end_time,
+                                    price_increment = _params.price_increment,
+                                    current_price = _params.current_price,
+                                    split_id = _params.split_id)
         self.data.next_auction_id += sp.nat(1)
         params = [
                 Batch_transfer.item(from_=sp.sender,
@@ -144,7 +190,6 @@ class Auction(sp.Contract):
                                        ])
             ]
         self.transfer_token(_params.token.address, params)
-        sp.emit(sp.record(token=_params.token.address,token_id=_params.token.token_id),tag="AUCTION_CREATED")
         
     @sp.entry_point
     def cancel_auction(self, auction_id):
@@ -152,7 +197,7 @@ class Auction(sp.Contract):
         sp.verify(self.data.auctions.contains(auction_id), "INVALID_AUCTION_ID")
         sp.verify(self.data.auctions[auction_id].creator == sp.sender, "INVALID_CREATOR")
         sp.if self.data.auctions[auction_id].current_price > sp.tez(0):
-            sp.send(self.data.auctions[auction_id].highest_bidder, self.data.auctions[auction_id].current_price)
+            self.credit(self.data.auctions[auction_id].highest_bidder, self.data.auctions[auction_id].current_price)
         _params = [
                 Batch_transfer.item(from_=sp.self_address,
                                        txs=[
@@ -162,49 +207,117 @@ class Auction(sp.Contract):
                                        ])
             ]
         self.transfer_token(self.data.auctions[auction_id].token.address, _params)
+        self.creator_index.remove(self.data.auctions_by_creator, sp.sender, auction_id)
         del self.data.auctions[auction_id]
-        sp.emit(sp.record(auction_id=auction_id,tag="AUCTION_CANCELED"))
+        events.AUCTION_CANCELED.emit(auction_id = auction_id)
     
-    @sp.entry_point
-    def bid(self, auction_id):
-        sp.set_type(auction_id, sp.TNat)
+    def place_bid(self, auction_id, amount, refunds):
         sp.verify(self.data.auctions.contains(auction_id), "INVALID_AUCTION_ID")
-        sp.verify(sp.amount >= self.data.auctions[auction_id].current_price + self.data.auctions[auction_id].price_increment, "INSUFFICIENT_AMOUNT")
+        sp.verify(amount >= self.data.auctions[auction_id].current_price + self.data.auctions[auction_id].price_increment, "INSUFFICIENT_AMOUNT")
         sp.verify(sp.now >= self.data.auctions[auction_id].start_time, "AUCTION_NOT_STARTED")
         sp.verify(sp.now <= self.data.auctions[auction_id].end_time, "AUCTION_ENDED")
         sp.if self.data.auctions[auction_id].highest_bidder != self.data.auctions[auction_id].creator:
-            sp.send(self.data.auctions[auction_id].highest_bidder, self.data.auctions[auction_id].current_price)
-        self.data.auctions[auction_id].current_price = sp.amount
+            self.add_payout(refunds, self.data.auctions[auction_id].highest_bidder, self.data.auctions[auction_id].current_price)
+        self.data.auctions[auction_id].current_price = amount
         self.data.auctions[auction_id].highest_bidder = sp.sender
-        sp.emit(sp.record(token=self.data.auctions[auction_id].token.address,token_id=self.data.auctions[auction_id].token.token_id,bid=sp.amount,bidder=sp.sender),tag="NEW_BID")
+        events.NEW_BID.emit(auction_id = auction_id, bidder = sp.sender, amount = amount)
+
+    @sp.entry_point
+    def bid(self, auction_id):
+        sp.set_type(auction_id, sp.TNat)
+        refunds = sp.local("refunds", sp.map(l = {}, tkey = sp.TAddress, tvalue = sp.TMutez))
+        self.place_bid(auction_id, sp.amount, refunds)
+        self.credit_payouts(refunds)
+
+    @sp.entry_point
+    def bid_many(self, params):
+        sp.set_type(params, sp.TList(sp.TRecord(auction_id = sp.TNat, amount = sp.TMutez)))
+        total_amount = sp.local("total_amount", sp.mutez(0))
+        refunds = sp.local("refunds", sp.map(l = {}, tkey = sp.TAddress, tvalue = sp.TMutez))
+        sp.for item in params:
+            total_amount.value += item.amount
+            self.place_bid(item.auction_id, item.amount, refunds)
+        sp.verify(sp.amount == total_amount.value, "INVALID_AMOUNT")
+        self.credit_payouts(refunds)
     
+    def close_auction(self, auction_id, transfers, payouts):
+        # Hands the token to the highest bidder and splits the winning bid.
+        # The token transfer and the payouts are only accumulated, so that a
+        # batch of auctions is settled with a single `transfer` call per FA2
+        # contract and a single balance update per recipient.
+        auction = self.data.auctions[auction_id]
+        transfers.value[auction.token.address] = sp.cons(
+            Batch_transfer.item(from_=sp.self_address,
+                                   txs=[
+                                       sp.record(to_=auction.highest_bidder,
+                                                 amount=1,
+                                                 token_id=auction.token.token_id)
+                                   ]),
+            transfers.value.get(auction.token.address, default_value = []))
+        # Without a bid, `current_price` is only the starting price: nothing
+        # was paid in and the token goes back to the creator.
+        sp.if auction.highest_bidder != auction.creator:
+            transfer_amount = sp.local("transfer_amount", auction.current_price)
+            self.add_payout(payouts, self.data.fund_operator, sp.split_tokens(transfer_amount.value, self.data.platform_fees, 1000000))
+            transfer_amount.value = transfer_amount.value - sp.split_tokens(transfer_amount.value, self.data.platform_fees, 1000000)
+            sp.for txn in self.data.splits[auction.split_id]:
+                self.add_payout(payouts, txn.recipient, sp.split_tokens(transfer_amount.value, txn.amount, 1000000))
+                transfer_amount.value = transfer_amount.value - sp.split_tokens(transfer_amount.value, txn.amount, 1000000)
+            self.add_payout(payouts, auction.creator, transfer_amount.value)
+        self.creator_index.remove(self.data.auctions_by_creator, auction.creator, auction_id)
+        del self.data.auctions[auction_id]
+        events.AUCTION_SETTLED.emit(auction_id = auction_id)
+
+    def pay_out(self, transfers, payouts):
+        sp.for contract in transfers.value.items():
+            self.transfer_token(contract.key, contract.value)
+        self.credit_payouts(payouts)
+
     @sp.entry_point
     def settle_auction(self, auction_id):
         sp.set_type(auction_id, sp.TNat)
         sp.verify(self.data.auctions.contains(auction_id), "INVALID_AUCTION_ID")
-        _params = [
-                Batch_transfer.item(from_=sp.self_address,
-                                       txs=[
-                                           sp.record(to_=self.data.auctions[auction_id].highest_bidder,
-                                                     amount=1,
-                                                     token_id=self.data.auctions[auction_id].token.token_id)
-                                       ])
-            ]
-        self.transfer_token(self.data.auctions[auction_id].token.address, _params)
-        transfer_amount = sp.local("transfer_amount", self.data.auctions[auction_id].current_price)
-        sp.send(self.data.fund_operator, sp.split_tokens(transfer_amount.value, self.data.platform_fees, 1000000))
-        transfer_amount.value = transfer_amount.value - sp.split_tokens(transfer_amount.value, self.data.platform_fees, 1000000)
-        sp.for txn in self.data.auctions[auction_id].shares:
-            sp.send(txn.recipient, sp.split_tokens(transfer_amount.value, txn.amount, 1000000))
-            transfer_amount.value = transfer_amount.value - sp.split_tokens(transfer_amount.value, txn.amount, 1000000)
-        sp.send(sp.sender, transfer_amount.value)
-        del self.data.auctions[auction_id]
-        sp.emit(sp.record(auction_id=auction_id,tag="AUCTION_SETTLED"))
+        sp.verify(sp.now > self.data.auctions[auction_id].end_time, "AUCTION_NOT_ENDED")
+        transfers = sp.local("transfers", sp.map(l = {}, tkey = sp.TAddress, tvalue = Batch_transfer.get_type()))
+        payouts = sp.local("payouts", sp.map(l = {}, tkey = sp.TAddress, tvalue = sp.TMutez))
+        self.close_auction(auction_id, transfers, payouts)
+        self.pay_out(transfers, payouts)
+
+    @sp.entry_point
+    def settle_auctions(self, auction_ids):
+        # Settles many lots in one operation, e.g. when a timed sale ends.
+        # Ids that are unknown, already settled or whose auction has not
+        # ended yet are skipped instead of failing the whole batch.
+        sp.set_type(auction_ids, sp.TList(sp.TNat))
+        transfers = sp.local("transfers", sp.map(l = {}, tkey = sp.TAddress, tvalue = Batch_transfer.get_type()))
+        payouts = sp.local("payouts", sp.map(l = {}, tkey = sp.TAddress, tvalue = sp.TMutez))
+        sp.for auction_id in auction_ids:
+            sp.if self.data.auctions.contains(auction_id):
+                sp.if sp.now > self.data.auctions[auction_id].end_time:
+                    self.close_auction(auction_id, transfers, payouts)
+        self.pay_out(transfers, payouts)
+
+    @sp.offchain_view(pure=True)
+    def get_auctions_of(self, params):
+        """The open auctions of `creator`, `limit` at most from `offset`."""
+        sp.set_type(params, self.creator_index.page_type())
+        sp.result(self.creator_index.page(
+            self.data.auctions_by_creator, params,
+            lambda auction_id: sp.record(auction_id = auction_id, auction = self.data.auctions[auction_id])))
+
+    @sp.entry_point
+    def withdraw(self):
+        amount = sp.local("amount", self.data.balances.get(sp.sender, default_value = sp.mutez(0)))
+        sp.verify(amount.value > sp.mutez(0), "NOTHING_TO_WITHDRAW")
+        del self.data.balances[sp.sender]
+        sp.send(sp.sender, amount.value)
+        events.BALANCE_WITHDRAWN.emit(recipient = sp.sender, amount = amount.value)
 
     @sp.entry_point
     def toggle_pause(self):
         sp.verify(self.data.mods.contains(sp.sender), "NOT_MODERATOR")
         self.data.pause = ~self.data.pause
+        events.PAUSE_TOGGLED.emit(pause = self.data.pause)
 
 
 @sp.add_test(name="Auction")
@@ -230,6 +343,17 @@ def test():
     sc += auc.add_moderator(alice).run(sender = admin)
     sc += auc.remove_moderator(alice).run(sender = admin)
 
+    sc.h1("Register Splits")
+    sc += auc.register_split([get_share.make(recipient= admin, amount=sp.nat(40000)),
+                  get_share.make(recipient= mark, amount=sp.nat(5000)),
+                  get_share.make(recipient= mark, amount=sp.nat(5000)),
+                  get_share.make(recipient= mark, amount=sp.nat(50000)),
+                  get_share.make(recipient= bob, amount=sp.nat(5000))]).run(sender = alice)
+    sc += auc.register_split([get_share.make(recipient= admin, amount=sp.nat(40000)),
+                  get_share.make(recipient= mark, amount=sp.nat(5000)),
+                  get_share.make(recipient= bob, amount=sp.nat(5000))]).run(sender = bob)
+    sc += auc.register_split([get_share.make(recipient= mark, amount=sp.nat(990000))]).run(sender = bob, valid = False)
+
     sc.h1("Create Auction")
     auc_data = sp.record(
             creator = alice,
@@ -242,11 +366,7 @@ def test():
             price_increment = sp.tez(1),
             current_price = sp.tez(0),
             highest_bidder = alice,
-            shares = [get_share.make(recipient= admin, amount=sp.nat(40000)),
-                  get_share.make(recipient= mark, amount=sp.nat(5000)),
-                  get_share.make(recipient= mark, amount=sp.nat(5000)),
-                  get_share.make(recipient= mark, amount=sp.nat(50000)),
-                  get_share.make(recipient= bob, amount=sp.nat(5000))]
+            split_id = sp.nat(1)
         )
     sc += auc.create_auction(auc_data).run(sender = alice)
     auc_data = sp.record(
@@ -260,12 +380,12 @@ def test():
             price_increment = sp.tez(1),
             current_price = sp.tez(0),
             highest_bidder = bob,
-            shares = [get_share.make(recipient= admin, amount=sp.nat(40000)),
-                  get_share.make(recipient= mark, amount=sp.nat(5000)),
-                  get_share.make(recipient= bob, amount=sp.nat(5000))]
+            split_id = sp.nat(2)
         )
     sc += auc.create_auction(auc_data).run(sender = bob)
     sc.show([sp.record(contract_balance = auc.balance)])
+    sc.verify(sp.len(auc.get_auctions_of(sp.record(creator = alice, offset = 0, limit = 10))) == 1)
+    sc.verify(sp.len(auc.get_auctions_of(sp.record(creator = bob, offset = 1, limit = 10))) == 0)
     
     sc.h1("Bid")
     sc += auc.bid(1).run(sender = elon, amount=sp.tez(1))
@@ -281,14 +401,116 @@ def test():
     sc += auc.bid(0).run(sender = admin, amount=sp.tez(5))
     sc.show([sp.record(contract_balance = auc.balance)])
     
+    sc.h1("Bid on several auctions")
+    sc += auc.bid_many([sp.record(auction_id = 0, amount = sp.tez(6)),
+                        sp.record(auction_id = 1, amount = sp.tez(2))]).run(sender = mark, amount = sp.tez(8))
+    sc += auc.bid_many([sp.record(auction_id = 0, amount = sp.tez(7)),
+                        sp.record(auction_id = 1, amount = sp.tez(3))]).run(sender = elon, amount = sp.tez(9), valid = False)
+    sc += auc.bid_many([sp.record(auction_id = 0, amount = sp.tez(7)),
+                        sp.record(auction_id = 1, amount = sp.tez(3))]).run(sender = elon, amount = sp.tez(10))
+    sc.show([sp.record(contract_balance = auc.balance)])
+    
     sc.h1("Cancel Auction")
     sc += auc.cancel_auction(sp.nat(1)).run(sender = bob)
+    sc.verify(sp.len(auc.get_auctions_of(sp.record(creator = bob, offset = 0, limit = 10))) == 0)
     sc.show([sp.record(contract_balance = auc.balance)])
     
     sc.h1("Settle Auction")
-    sc += auc.settle_auction(sp.nat(0)).run(sender = alice)
+    sc += auc.settle_auction(sp.nat(0)).run(sender = alice, now = sp.timestamp(10), valid = False)
+    sc += auc.settle_auction(sp.nat(0)).run(sender = alice, now = sp.timestamp(11))
+    sc.show([sp.record(contract_balance = auc.balance)])
+    
+    sc.h1("Settle several auctions")
+    carol = sp.address("tz1ooCAROL")
+    for end_time in [20, 20, 100]:
+        sc += auc.create_auction(sp.record(
+                creator = alice,
+                token = sp.record(
+                    address = sp.address("KT1TezoooozzSmartPyzzDYNAMiCzzpLu4LU"),
+                    token_id = sp.nat(2)
+                    ),
+                start_time = sp.timestamp(0),
+                end_time = sp.timestamp(end_time),
+                price_increment = sp.tez(1),
+                current_price = sp.tez(0),
+                highest_bidder = alice,
+                split_id = sp.nat(2)
+            )).run(sender = alice, now = sp.timestamp(11))
+    # No one bids on auction 5, whose starting price is 5 tez.
+    sc += auc.create_auction(sp.record(
+            creator = carol,
+            token = sp.record(
+                address = sp.address("KT1TezoooozzSmartPyzzDYNAMiCzzpLu4LU"),
+                token_id = sp.nat(3)
+                ),
+            start_time = sp.timestamp(0),
+            end_time = sp.timestamp(20),
+            price_increment = sp.tez(1),
+            current_price = sp.tez(5),
+            highest_bidder = carol,
+            split_id = sp.nat(0)
+        )).run(sender = carol, now = sp.timestamp(11))
+    sc += auc.bid_many([sp.record(auction_id = 2, amount = sp.tez(1)),
+                        sp.record(auction_id = 3, amount = sp.tez(2))]).run(sender = elon, amount = sp.tez(3), now = sp.timestamp(15))
+    sc += auc.settle_auctions([2, 3, 4, 5, 7, 2]).run(sender = bob, now = sp.timestamp(21))
+    sc.verify(~auc.data.auctions.contains(2))
+    sc.verify(~auc.data.auctions.contains(3))
+    sc.verify(auc.data.auctions.contains(4))
+    sc.verify(~auc.data.auctions.contains(5))
+    sc.verify(~auc.data.balances.contains(carol))
+    sc.verify(sp.len(auc.get_auctions_of(sp.record(creator = alice, offset = 0, limit = 10))) == 1)
+
+    sc.h1("Withdraw")
+    sc += auc.withdraw().run(sender = mark)
+    sc += auc.withdraw().run(sender = mark, valid = False)
+    sc += auc.withdraw().run(sender = alice)
     sc.show([sp.record(contract_balance = auc.balance)])
     
     sc.h1("toggle_pause")
     sc += auc.toggle_pause().run(sender = admin)
     sc += auc.update_platform_fees(1200).run(sender = admin)
+
+
+@sp.add_test(name="Auction-DuplicatePayees", is_default=False)
+def test():
+    sc = sp.test_scenario()
+    sc.h1("Settlement with duplicate payees")
+    sc.p("The shares below name mark five times. Settlement folds them into one payout per recipient, so mark's balance is credited once instead of five times. Scenarios don't report gas: the auction_settle_auction_same_payee_shares and auction_settle_auction_shares cases of benchmark.py compare the settlement with shares to one recipient and to distinct ones, with `python bench_report.py`.")
+    admin           =   sp.address("tz1ooADMIN")
+    alice           =   sp.address("tz1ooALICE")
+    bob             =   sp.address("tz1ooBOB")
+    elon            =   sp.address("tz1ooELON")
+    mark            =   sp.address("tz1ooMARK")
+    fund_operator   =   sp.address("tz1ooFUNDoOP")
+    get_share = Share()
+
+    auc = Auction(mods = [admin], fund_operator = fund_operator)
+    sc += auc
+
+    def auction(creator, token_id, split_id):
+        return sp.record(
+            creator = creator,
+            token = sp.record(
+                address = sp.address("KT1TezoooozzSmartPyzzDYNAMiCzzpLu4LU"),
+                token_id = sp.nat(token_id)
+                ),
+            start_time = sp.timestamp(0),
+            end_time = sp.timestamp(10),
+            price_increment = sp.tez(1),
+            current_price = sp.tez(0),
+            highest_bidder = creator,
+            split_id = sp.nat(split_id)
+        )
+
+    sc += auc.register_split([get_share.make(recipient = mark, amount = sp.nat(10000)) for i in range(5)]).run(sender = alice)
+    sc += auc.register_split([get_share.make(recipient = r, amount = sp.nat(10000)) for r in [admin, alice, mark, elon, fund_operator]]).run(sender = bob)
+
+    sc.h2("Five shares to the same recipient")
+    sc += auc.create_auction(auction(alice, 0, 1)).run(sender = alice)
+    sc += auc.bid(0).run(sender = elon, amount = sp.tez(10))
+    sc += auc.settle_auction(0).run(sender = alice, now = sp.timestamp(11))
+
+    sc.h2("Five shares to distinct recipients")
+    sc += auc.create_auction(auction(bob, 1, 2)).run(sender = bob)
+    sc += auc.bid(1).run(sender = elon, amount = sp.tez(10))
+    sc += auc.settle_auction(1).run(sender = bob, now = sp.timestamp(11))
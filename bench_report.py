@@ -0,0 +1,331 @@
+"""Turn the `benchmark.py` compilation targets into a gas/storage table.
+
+Each `bench_<case>_<size>` target is run with the Tezos client in mockup mode
+through the `trace_code` RPC, using its `bench_<case>_<size>_param` target as
+the entry point parameter. One row is printed per target:
+
+    case  contract  entrypoint  sweep  size  gas  storage_diff  param_micheline_bytes  operations
+
+`gas` is the gas consumed by the script, `storage_diff` the bytes it adds to
+the storage and `param_micheline_bytes` the binary Micheline size of the
+parameter value. That is the part of the forged operation that varies
+between targets; the transaction envelope around it is not counted.
+
+The output is sorted and tab-separated so that two runs can be compared with
+`diff`. Usage:
+
+    SmartPy.sh compile benchmark.py bench/
+    python bench_report.py bench/ [--client octez-client] [--format tsv|json]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# The FA2 address used as a placeholder in `benchmark.py`.
+TOKEN_PLACEHOLDER = "KT1TezoooozzSmartPyzzDYNAMiCzzpLu4LU"
+
+GAS_LIMIT = 1040000
+
+CONTRACTS = {
+    "fa2": "FA2",
+    "marketplace": "Marketplace",
+    "auction": "Auction",
+    "curation": "MainContract",
+}
+
+
+def bench_address(i):
+    """Same derivation as `bench_address` in `benchmark.py`."""
+    payload = b"\x06\xa1\x9f" + hashlib.sha256(b"bench-%d" % i).digest()[:20]
+    payload += hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    alphabet = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+    n = int.from_bytes(payload, "big")
+    encoded = ""
+    while n > 0:
+        n, r = divmod(n, 58)
+        encoded = alphabet[r] + encoded
+    return encoded
+
+
+# How each case is called: the contract and entry point measured, what the
+# size of the case sweeps over, and the sender, amount (mutez) and timestamp.
+CASES = {
+    "fa2_transfer_holders": dict(contract="fa2", entrypoint="transfer", sweep="holders",
+                                 sender=bench_address(100), amount=0, now=0),
+    "fa2_nft_ledger_transfer_holders": dict(contract="fa2", entrypoint="transfer", sweep="holders",
+                                            sender=bench_address(100), amount=0, now=0),
+    "fa2_remove_zero_transfer_holders": dict(contract="fa2", entrypoint="transfer", sweep="holders",
+                                             sender=bench_address(100), amount=0, now=0),
+    "fa2_remove_zero_balances_rows": dict(contract="fa2", entrypoint="remove_zero_balances", sweep="rows",
+                                          sender=bench_address(0), amount=0, now=0),
+    "marketplace_fulfill_ask_listings": dict(contract="marketplace", entrypoint="fulfill_ask", sweep="listings",
+                                             sender=bench_address(2), amount=1000000, now=0),
+    "marketplace_fulfill_ask_shares": dict(contract="marketplace", entrypoint="fulfill_ask", sweep="shares",
+                                           sender=bench_address(2), amount=1000000, now=0),
+    "marketplace_fulfill_ask_map_listings": dict(contract="marketplace", entrypoint="fulfill_ask", sweep="listings",
+                                                 sender=bench_address(2), amount=1000000, now=0),
+    "marketplace_fulfill_ask_big_map_listings": dict(contract="marketplace", entrypoint="fulfill_ask", sweep="listings",
+                                                     sender=bench_address(2), amount=1000000, now=0),
+    "marketplace_ask_map_listings": dict(contract="marketplace", entrypoint="ask", sweep="listings",
+                                         sender=bench_address(1), amount=0, now=0),
+    "marketplace_ask_big_map_listings": dict(contract="marketplace", entrypoint="ask", sweep="listings",
+                                             sender=bench_address(1), amount=0, now=0),
+    "marketplace_fulfill_best_ask_asks": dict(contract="marketplace", entrypoint="fulfill_best_ask", sweep="asks",
+                                              sender=bench_address(2), amount=1000000, now=0),
+    "marketplace_purge_expired_purged": dict(contract="marketplace", entrypoint="purge_expired", sweep="purged",
+                                             sender=bench_address(2), amount=0, now=3600),
+    "auction_bid_auctions": dict(contract="auction", entrypoint="bid", sweep="auctions",
+                                 sender=bench_address(2), amount=2000000, now=5),
+    "auction_settle_auction_auctions": dict(contract="auction", entrypoint="settle_auction", sweep="auctions",
+                                            sender=bench_address(1), amount=0, now=20),
+    "auction_settle_auction_shares": dict(contract="auction", entrypoint="settle_auction", sweep="shares",
+                                          sender=bench_address(1), amount=0, now=20),
+    "auction_settle_auction_same_payee_shares": dict(contract="auction", entrypoint="settle_auction", sweep="shares",
+                                                     sender=bench_address(1), amount=0, now=20),
+    "auction_settle_auctions_lots": dict(contract="auction", entrypoint="settle_auctions", sweep="lots",
+                                         sender=bench_address(1), amount=0, now=20),
+    "curation_vote_on_artproposal_proposals": dict(contract="curation", entrypoint="vote_on_artproposal", sweep="proposals",
+                                                   sender=bench_address(3), amount=0, now=20),
+    "curation_vote_on_artproposal_map_proposals": dict(contract="curation", entrypoint="vote_on_artproposal", sweep="proposals",
+                                                       sender=bench_address(3), amount=0, now=20),
+    "curation_vote_on_artproposal_big_map_proposals": dict(contract="curation", entrypoint="vote_on_artproposal", sweep="proposals",
+                                                           sender=bench_address(3), amount=0, now=20),
+}
+
+TARGET = re.compile(r"^bench_(?P<case>[a-z_]+?)_(?P<size>\d+)$")
+
+
+# Micheline binary size
+##
+# Sizes follow the untyped binary encoding used by `PACK` (without the 0x05
+# prefix), which is what storage and parameters are accounted with.
+
+def zarith_size(n):
+    n = abs(n) >> 6
+    size = 1
+    while n:
+        n >>= 7
+        size += 1
+    return size
+
+
+def micheline_size(node):
+    if isinstance(node, list):
+        return 1 + 4 + sum(micheline_size(x) for x in node)
+    if "int" in node:
+        return 1 + zarith_size(int(node["int"]))
+    if "string" in node:
+        return 1 + 4 + len(node["string"].encode())
+    if "bytes" in node:
+        return 1 + 4 + len(node["bytes"]) // 2
+    args = node.get("args", [])
+    annots = node.get("annots", [])
+    size = 1 + 1 + sum(micheline_size(a) for a in args)
+    if len(args) > 2:
+        size += 4
+    if annots or len(args) > 2:
+        size += 4 + len(" ".join(annots).encode())
+    return size
+
+
+class Client:
+    def __init__(self, command, base_dir):
+        self.command = command
+        self.base_dir = base_dir
+
+    def run(self, *args):
+        result = subprocess.run(
+            [self.command, "--mode", "mockup", "--base-dir", self.base_dir] + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError("%s failed:\n%s" % (" ".join(args[:3]), result.stderr))
+        return result.stdout
+
+    def rpc_get(self, path):
+        return json.loads(self.run("rpc", "get", path))
+
+    def rpc_post(self, path, data):
+        return json.loads(self.run("rpc", "post", path, "with", json.dumps(data)))
+
+    def to_json(self, kind, michelson):
+        return json.loads(self.run("convert", kind, michelson, "from", "michelson", "to", "json"))
+
+
+def read_target(client, directory, suffix):
+    """Loads the `*<suffix>.json` file of a target, or converts its `.tz`."""
+    found = sorted(glob.glob(os.path.join(directory, "*%s.json" % suffix)))
+    if found:
+        with open(found[0]) as f:
+            return json.load(f)
+    found = sorted(glob.glob(os.path.join(directory, "*%s.tz" % suffix)))
+    if not found:
+        raise FileNotFoundError("no %s in %s" % (suffix, directory))
+    with open(found[0]) as f:
+        return client.to_json("script" if suffix == "contract" else "data", f.read())
+
+
+def substitute(node, old, new):
+    if isinstance(node, list):
+        return [substitute(x, old, new) for x in node]
+    if isinstance(node, dict):
+        if node.get("string") == old:
+            return {"string": new}
+        return dict((k, substitute(v, old, new)) for k, v in node.items())
+    return node
+
+
+def big_map_literals(before, after, found):
+    """Walks the input and output storage side by side; wherever the input
+    holds a literal big_map and the output holds its id, records id -> literal.
+    """
+    if isinstance(after, dict) and "int" in after and isinstance(before, list):
+        found[after["int"]] = before
+        return
+    if isinstance(before, list) and isinstance(after, list):
+        for b, a in zip(before, after):
+            big_map_literals(b, a, found)
+    elif isinstance(before, dict) and isinstance(after, dict):
+        if before.get("prim") == after.get("prim"):
+            for b, a in zip(before.get("args", []), after.get("args", [])):
+                big_map_literals(b, a, found)
+
+
+def without_big_maps(node, ids):
+    if isinstance(node, dict) and "int" in node and node["int"] in ids:
+        return {"int": "0"}
+    if isinstance(node, list):
+        return [without_big_maps(x, ids) for x in node]
+    if isinstance(node, dict) and "args" in node:
+        return dict(node, args=[without_big_maps(a, ids) for a in node["args"]])
+    return node
+
+
+def storage_diff(storage, result):
+    """Bytes added to (or freed from) the storage by the call."""
+    literals = {}
+    big_map_literals(storage, result["storage"], literals)
+    contents = {}
+    for map_id, literal in literals.items():
+        contents[map_id] = dict((json.dumps(elt["args"][0], sort_keys=True), elt["args"][1]) for elt in literal)
+    before = sum(sum(micheline_size(json.loads(k)) + micheline_size(v) for k, v in c.items()) for c in contents.values())
+    # The inline part of the storage, with each big_map counted as its id.
+    before += micheline_size(storage) - sum(micheline_size(l) - micheline_size({"int": "0"}) for l in literals.values())
+    for diff in result.get("lazy_storage_diff", []):
+        if diff.get("kind") != "big_map":
+            continue
+        map_id = diff["id"]
+        action = diff["diff"]["action"]
+        if action == "remove":
+            contents.pop(map_id, None)
+            continue
+        if action == "alloc":
+            contents.setdefault(map_id, {})
+        elif action == "copy":
+            contents[map_id] = dict(contents.get(diff["diff"]["source"], {}))
+        for update in diff["diff"].get("updates", []):
+            key = json.dumps(update["key"], sort_keys=True)
+            if "value" in update:
+                contents.setdefault(map_id, {})[key] = update["value"]
+            else:
+                contents.get(map_id, {}).pop(key, None)
+    after = sum(sum(micheline_size(json.loads(k)) + micheline_size(v) for k, v in c.items()) for c in contents.values())
+    after += micheline_size(without_big_maps(result["storage"], set(contents)))
+    return after - before
+
+
+def gas_used(trace):
+    """Gas consumed by a `trace_code` run: each step reports the gas left,
+    so the consumption is the limit minus the last value."""
+    values = [float(step["gas"]) for step in trace if "gas" in step]
+    if not values or values != sorted(values, reverse=True) or values[0] > GAS_LIMIT:
+        raise ValueError("trace does not report the remaining gas at each step: %r..." % values[:5])
+    return round(GAS_LIMIT - values[-1], 3)
+
+
+def measure(client, chain_id, token, directory, case, size):
+    settings = CASES[case]
+    script = read_target(client, directory, "contract")
+    storage = substitute(read_target(client, directory, "storage"), TOKEN_PLACEHOLDER, token)
+    param = substitute(read_target(client, directory + "_param", "expression"), TOKEN_PLACEHOLDER, token)
+    result = client.rpc_post("/chains/main/blocks/head/helpers/scripts/trace_code", {
+        "script": script,
+        "storage": storage,
+        "input": param,
+        "amount": str(settings["amount"]),
+        "chain_id": chain_id,
+        "source": settings["sender"],
+        "payer": settings["sender"],
+        "entrypoint": settings["entrypoint"],
+        "gas": str(GAS_LIMIT),
+        "now": str(settings["now"]),
+        "unparsing_mode": "Readable",
+    })
+    return dict(
+        case=case,
+        contract=CONTRACTS[settings["contract"]],
+        entrypoint=settings["entrypoint"],
+        sweep=settings["sweep"],
+        size=size,
+        gas=gas_used(result.get("trace", [])),
+        storage_diff=storage_diff(storage, result),
+        param_micheline_bytes=micheline_size(param),
+        operations=len(result.get("operations", [])),
+    )
+
+
+def originate_token(client, output):
+    directory = os.path.join(output, "bench_token")
+    code = sorted(glob.glob(os.path.join(directory, "*contract.tz")))[0]
+    with open(sorted(glob.glob(os.path.join(directory, "*storage.tz")))[0]) as f:
+        storage = f.read()
+    client.run("originate", "contract", "bench_token", "transferring", "0",
+               "from", "bootstrap1", "running", code, "--init", storage,
+               "--burn-cap", "100", "--force")
+    return client.run("show", "known", "contract", "bench_token").strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="directory written by `SmartPy.sh compile benchmark.py`")
+    parser.add_argument("--client", default="octez-client")
+    parser.add_argument("--format", choices=["tsv", "json"], default="tsv")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        client = Client(args.client, base_dir)
+        client.run("create", "mockup")
+        chain_id = client.rpc_get("/chains/main/chain_id")
+        token = originate_token(client, args.output)
+        rows = []
+        for directory in sorted(glob.glob(os.path.join(args.output, "bench_*"))):
+            match = TARGET.match(os.path.basename(directory))
+            if not match or match.group("case") not in CASES:
+                continue
+            try:
+                rows.append(measure(client, chain_id, token, directory,
+                                    match.group("case"), int(match.group("size"))))
+            except RuntimeError as e:
+                # E.g. the gas limit is hit: report the other targets anyway.
+                sys.stderr.write("skipped %s: %s\n" % (os.path.basename(directory), e))
+
+    rows.sort(key=lambda r: (r["case"], r["size"]))
+    if args.format == "json":
+        json.dump(rows, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        columns = ["case", "contract", "entrypoint", "sweep", "size", "gas",
+                   "storage_diff", "param_micheline_bytes", "operations"]
+        print("\t".join(columns))
+        for row in rows:
+            print("\t".join(str(row[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import hashlib
+import smartpy as sp
+
+# Gas and storage benchmarks
+##
+# Every `bench_<case>_<size>` compilation target below is one contract
+# originated with `size` entries of pre-existing state, next to a
+# `bench_<case>_<size>_param` expression target holding the parameter of the
+# entry point being measured. `bench_report.py` runs each pair through the
+# Tezos client and prints gas, storage diff and the Micheline size of the
+# parameter as a table.
+#
+#     SmartPy.sh compile benchmark.py bench/
+#     python bench_report.py bench/ > bench.tsv
+##
+FA2_contract = sp.io.import_stored_contract('FA2.py')
+marketplace = sp.io.import_stored_contract('marketplace.py')
+auction = sp.io.import_stored_contract('auction.py')
+curation = sp.io.import_stored_contract('Artist-Curator.py')
+creator_index = sp.io.import_stored_contract('creator_index.py')
+
+STATE_SIZES = [10, 100, 1000]
+SHARE_COUNTS = [1, 5, 20]
+# Batch sizes of the keeper's purge_expired and settle_auctions calls
+# (`--max-batch`, 50 by default).
+PURGE_COUNTS = [1, 10, 50, 100]
+LOT_COUNTS = [1, 10, 50, 100]
+ZERO_ROW_COUNTS = [1, 10, 50]
+# Open listings of the order book cases, run with both storage layouts.
+BOOK_SIZES = [10, 1000, 10000]
+LAYOUTS = [(False, "map"), (True, "big_map")]
+PROPOSAL_COUNTS = [10, 1000, 5000]
+
+# Placeholder for the FA2 contract the marketplace and auctions talk to;
+# `bench_report.py` originates `bench_token` and substitutes its address.
+TOKEN = sp.address("KT1TezoooozzSmartPyzzDYNAMiCzzpLu4LU")
+
+
+def bench_address(i):
+    """Deterministic, valid tz1 address number `i` (the same derivation is
+    used by `bench_report.py` for the senders)."""
+    payload = b"\x06\xa1\x9f" + hashlib.sha256(b"bench-%d" % i).digest()[:20]
+    payload += hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    alphabet = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+    n = int.from_bytes(payload, "big")
+    encoded = ""
+    while n > 0:
+        n, r = divmod(n, 58)
+        encoded = alphabet[r] + encoded
+    return sp.address(encoded)
+
+
+ADMIN = bench_address(0)
+SELLER = bench_address(1)
+BUYER = bench_address(2)
+CURATOR = bench_address(3)
+
+
+def shares(count, same_payee = False):
+    return [marketplace.Share().make(recipient = bench_address(1000 if same_payee else 1000 + i), amount = sp.nat(100)) for i in range(count)]
+
+
+def split_storage(share_count, same_payee = False):
+    # Split 1 holds `share_count` shares; every listing and auction uses it.
+    return dict(
+        splits = sp.big_map(l = {0: [], 1: shares(share_count, same_payee)}, tkey = sp.TNat, tvalue = sp.TList(marketplace.Share().get_type())),
+        next_split_id = sp.nat(2),
+    )
+
+
+def add_case(case, size, contract, param):
+    sp.add_compilation_target("bench_%s_%d" % (case, size), contract)
+    sp.add_expression_compilation_target("bench_%s_%d_param" % (case, size), param)
+
+
+def token_contract(config = None):
+    return FA2_contract.FA2(config = config or FA2_contract.environment_config(),
+                            metadata = sp.utils.metadata_of_url("https://example.com"),
+                            admin = ADMIN)
+
+
+# FA2.transfer, swept over the number of token holders.
+
+def fa2_ledger(rows):
+    return sp.big_map(l = dict([(sp.pair(owner, sp.nat(token_id)), FA2_contract.Ledger_value.make(balance)) for owner, token_id, balance in rows]),
+                      tkey = sp.TPair(sp.TAddress, sp.TNat), tvalue = FA2_contract.Ledger_value.get_type())
+
+
+def fa2_transfer(holders, config = None):
+    fa2 = token_contract(config)
+    fa2.update_initial_storage(
+        ledger = fa2_ledger([(bench_address(100 + i), i, 1) for i in range(holders)]),
+        token_metadata = sp.big_map(l = dict([(i, sp.record(token_id = sp.nat(i), token_info = {"": sp.bytes("0x00")})) for i in range(holders)]),
+                                    tkey = sp.TNat, tvalue = fa2.token_meta_data.get_type()),
+        all_tokens = sp.nat(holders),
+    )
+    param = [fa2.batch_transfer.item(from_ = bench_address(100),
+                                     txs = [sp.record(to_ = BUYER, amount = 1, token_id = 0)])]
+    return fa2, param
+
+
+# The same transfer with the `nft_ledger` layout (token-id -> owner).
+
+def fa2_nft_ledger_transfer(holders):
+    fa2 = token_contract(FA2_contract.FA2_config(store_total_supply = False,
+                                                 use_token_metadata_offchain_view = True,
+                                                 nft_ledger = True))
+    fa2.update_initial_storage(
+        ledger = sp.big_map(l = dict([(sp.nat(i), bench_address(100 + i)) for i in range(holders)]),
+                            tkey = sp.TNat, tvalue = sp.TAddress),
+        token_metadata = sp.big_map(l = dict([(i, sp.record(token_id = sp.nat(i), token_info = {"": sp.bytes("0x00")})) for i in range(holders)]),
+                                    tkey = sp.TNat, tvalue = fa2.token_meta_data.get_type()),
+        all_tokens = sp.nat(holders),
+    )
+    param = [fa2.batch_transfer.item(from_ = bench_address(100),
+                                     txs = [sp.record(to_ = BUYER, amount = 1, token_id = 0)])]
+    return fa2, param
+
+
+# The same transfer with `remove_zero_balances`, which deletes the emptied
+# (owner, token-id) row in the transfer itself.
+
+def fa2_remove_zero_transfer(holders):
+    return fa2_transfer(holders, FA2_contract.FA2_config(store_total_supply = False,
+                                                         use_token_metadata_offchain_view = True,
+                                                         remove_zero_balances = True))
+
+
+# FA2.remove_zero_balances, swept over the number of zero-balance rows the
+# administrator deletes from a ledger of 100 holders.
+
+def fa2_remove_zero_balances(rows):
+    fa2 = token_contract()
+    fa2.update_initial_storage(
+        ledger = fa2_ledger([(bench_address(100 + i), i, 0 if i < rows else 1) for i in range(max(rows, 100))]),
+    )
+    return fa2, [sp.record(owner = bench_address(100 + i), token_id = sp.nat(i)) for i in range(rows)]
+
+
+# Marketplace.fulfill_ask, swept over open listings and split length.
+
+def listing(token_id, expiry_time = sp.none):
+    return sp.record(
+        creator = SELLER,
+        token = sp.record(address = TOKEN, token_id = sp.nat(token_id)),
+        amount = sp.tez(1),
+        editions = sp.nat(1),
+        expiry_time = expiry_time,
+        split_id = sp.nat(1))
+
+
+def order_book(listings, share_count, lazy_books = True):
+    mp = marketplace.Marketplace(mods = [ADMIN], fund_operator = ADMIN, lazy_books = lazy_books)
+    maps = sp.big_map if lazy_books else sp.map
+    mp.update_initial_storage(
+        asks = maps(l = dict([(i, listing(i)) for i in range(listings)]),
+                    tkey = sp.TNat, tvalue = marketplace.Ask().type_value),
+        next_ask_id = sp.nat(listings),
+        asks_by_creator = creator_index.Creator_index().make([(SELLER, range(listings))]),
+        **marketplace.best_ask_storage([(sp.record(address = TOKEN, token_id = sp.nat(i)), [i]) for i in range(listings)], lazy_books),
+        **split_storage(share_count)
+    )
+    return mp
+
+
+def marketplace_fulfill_ask(listings, share_count, lazy_books = True):
+    return order_book(listings, share_count, lazy_books), sp.nat(0)
+
+
+# Marketplace.ask, swept over open listings.
+
+def marketplace_ask(listings, lazy_books = True):
+    return order_book(listings, 1, lazy_books), listing(listings)
+
+
+# Marketplace.fulfill_best_ask, swept over the open asks of one token. The
+# asks have the same price, so the heap holds them in ask-id order.
+
+def marketplace_fulfill_best_ask(asks):
+    token = sp.record(address = TOKEN, token_id = sp.nat(0))
+    mp = marketplace.Marketplace(mods = [ADMIN], fund_operator = ADMIN)
+    mp.update_initial_storage(
+        asks = sp.big_map(l = dict([(i, listing(0)) for i in range(asks)]),
+                          tkey = sp.TNat, tvalue = marketplace.Ask().type_value),
+        next_ask_id = sp.nat(asks),
+        asks_by_creator = creator_index.Creator_index().make([(SELLER, range(asks))]),
+        **marketplace.best_ask_storage([(token, list(range(asks)))]),
+        **split_storage(1)
+    )
+    return mp, token
+
+
+# Marketplace.purge_expired, swept over the number of asks purged from a
+# bucket of 100 expired asks.
+
+def marketplace_purge_expired(purged):
+    listings = 100
+    mp = marketplace.Marketplace(mods = [ADMIN], fund_operator = ADMIN)
+    mp.update_initial_storage(
+        asks = sp.big_map(l = dict([(i, listing(i, sp.some(sp.timestamp(5)))) for i in range(listings)]),
+                          tkey = sp.TNat, tvalue = marketplace.Ask().type_value),
+        next_ask_id = sp.nat(listings),
+        asks_by_creator = creator_index.Creator_index().make([(SELLER, range(listings))]),
+        asks_by_expiry = sp.big_map(l = {0: sp.set(range(listings), t = sp.TNat)}, tkey = sp.TInt, tvalue = sp.TSet(sp.TNat)),
+        **marketplace.best_ask_storage([(sp.record(address = TOKEN, token_id = sp.nat(i)), [i]) for i in range(listings)]),
+        **split_storage(1)
+    )
+    return mp, sp.record(buckets = [0], limit = sp.nat(purged))
+
+
+# Auction.bid / settle_auction, swept over open auctions and split length.
+
+def auction_record(token_id):
+    return sp.record(
+        creator = SELLER,
+        token = sp.record(address = TOKEN, token_id = sp.nat(token_id)),
+        start_time = sp.timestamp(0),
+        end_time = sp.timestamp(10),
+        price_increment = sp.tez(1),
+        current_price = sp.tez(1),
+        highest_bidder = bench_address(200),
+        split_id = sp.nat(1))
+
+
+def auction_with(auctions, share_count, same_payee = False):
+    auc = auction.Auction(mods = [ADMIN], fund_operator = ADMIN)
+    auc.update_initial_storage(
+        auctions = sp.big_map(l = dict([(i, auction_record(i)) for i in range(auctions)]),
+                              tkey = sp.TNat, tvalue = auction.AuctionData().get_type()),
+        next_auction_id = sp.nat(auctions),
+        auctions_by_creator = creator_index.Creator_index().make([(SELLER, range(auctions))]),
+        **split_storage(share_count, same_payee)
+    )
+    return auc, sp.nat(0)
+
+
+# Auction.settle_auctions, swept over the number of ended lots settled at once.
+
+def auction_settle_many(lots):
+    auc, _ = auction_with(100, 1)
+    return auc, sp.list([sp.nat(i) for i in range(lots)], t = sp.TNat)
+
+
+# MainContract.vote_on_artproposal, swept over the number of proposals.
+
+def curation_vote(proposals, lazy_storage = True):
+    dao = curation.MainContract(nft_contract_address = TOKEN, lazy_storage = lazy_storage)
+    maps = sp.big_map if lazy_storage else sp.map
+    proposal = sp.record(artist = SELLER, art_metadata = sp.bytes("0xdaad"), price = sp.nat(5), editions = sp.nat(3), mint_index = sp.nat(0), time_of_creation = sp.timestamp(0), time_of_expiration = sp.timestamp(28), votes_in_favour = sp.nat(0), votes_in_against = sp.nat(0), is_minted = False)
+    dao.update_initial_storage(
+        curators = sp.set([CURATOR], t = sp.TAddress),
+        profile = maps(l = {SELLER: sp.bytes("0x30"), CURATOR: sp.bytes("0x31")}, tkey = sp.TAddress, tvalue = sp.TBytes),
+        art_proposal_ids = maps(l = {SELLER: sp.set(range(1, proposals + 1), t = sp.TNat)}, tkey = sp.TAddress, tvalue = sp.TSet(t = sp.TNat)),
+        art_proposal_details = maps(l = dict([(i, proposal) for i in range(1, proposals + 1)]), tkey = sp.TNat, tvalue = curation.ArtProposal().get_type()),
+        art_proposal_counter = sp.nat(proposals),
+    )
+    return dao, sp.nat(proposals)
+
+
+sp.add_compilation_target("bench_token", token_contract())
+
+for size in STATE_SIZES:
+    add_case("fa2_transfer_holders", size, *fa2_transfer(size))
+    add_case("fa2_nft_ledger_transfer_holders", size, *fa2_nft_ledger_transfer(size))
+    add_case("fa2_remove_zero_transfer_holders", size, *fa2_remove_zero_transfer(size))
+    add_case("marketplace_fulfill_ask_listings", size, *marketplace_fulfill_ask(size, 1))
+    add_case("auction_bid_auctions", size, *auction_with(size, 1))
+    add_case("auction_settle_auction_auctions", size, *auction_with(size, 1))
+    add_case("curation_vote_on_artproposal_proposals", size, *curation_vote(size))
+
+for size in BOOK_SIZES:
+    for lazy_books, layout in LAYOUTS:
+        add_case("marketplace_fulfill_ask_%s_listings" % layout, size, *marketplace_fulfill_ask(size, 1, lazy_books))
+        add_case("marketplace_ask_%s_listings" % layout, size, *marketplace_ask(size, lazy_books))
+    add_case("marketplace_fulfill_best_ask_asks", size, *marketplace_fulfill_best_ask(size))
+
+for count in PROPOSAL_COUNTS:
+    for lazy_storage, layout in LAYOUTS:
+        add_case("curation_vote_on_artproposal_%s_proposals" % layout, count, *curation_vote(count, lazy_storage))
+
+for count in PURGE_COUNTS:
+    add_case("marketplace_purge_expired_purged", count, *marketplace_purge_expired(count))
+
+for count in ZERO_ROW_COUNTS:
+    add_case("fa2_remove_zero_balances_rows", count, *fa2_remove_zero_balances(count))
+
+for count in LOT_COUNTS:
+    add_case("auction_settle_auctions_lots", count, *auction_settle_many(count))
+
+for count in SHARE_COUNTS:
+    add_case("marketplace_fulfill_ask_shares", count, *marketplace_fulfill_ask(10, count))
+    add_case("auction_settle_auction_shares", count, *auction_with(10, count))
+    add_case("auction_settle_auction_same_payee_shares", count, *auction_with(10, count, same_payee = True))
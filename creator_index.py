@@ -0,0 +1,72 @@
+import smartpy as sp
+
+# Creator index
+##
+# The open asks, offers and auctions of each creator, kept so that wallets
+# can page through their own entries instead of enumerating the whole book.
+# The ids of a creator sit in consecutive slots `(creator, 0..size-1)`;
+# removing an id moves the creator's last id into the freed slot, so both
+# updates touch a constant number of big-map entries and a page of `limit`
+# ids costs `limit` lookups.
+##
+
+
+class Creator_index:
+    def get_type(self):
+        return sp.TRecord(
+            size = sp.TBigMap(sp.TAddress, sp.TNat),
+            ids = sp.TBigMap(sp.TPair(sp.TAddress, sp.TNat), sp.TNat),
+            slots = sp.TBigMap(sp.TNat, sp.TNat))
+
+    def page_type(self):
+        return sp.TRecord(
+            creator = sp.TAddress,
+            offset = sp.TNat,
+            limit = sp.TNat).layout(("creator", ("offset", "limit")))
+
+    def make(self, entries = []):
+        # `entries` holds (creator, ids) pairs, for storage seeded outside of
+        # the entry points (tests and benchmarks).
+        size = {}
+        ids = {}
+        slots = {}
+        for creator, creator_ids in entries:
+            size[creator] = sp.nat(len(creator_ids))
+            for slot, id in enumerate(creator_ids):
+                ids[sp.pair(creator, sp.nat(slot))] = sp.nat(id)
+                slots[sp.nat(id)] = sp.nat(slot)
+        return sp.record(
+            size = sp.big_map(l = size, tkey = sp.TAddress, tvalue = sp.TNat),
+            ids = sp.big_map(l = ids, tkey = sp.TPair(sp.TAddress, sp.TNat), tvalue = sp.TNat),
+            slots = sp.big_map(l = slots, tkey = sp.TNat, tvalue = sp.TNat))
+
+    def add(self, index, creator, id):
+        size = sp.local("creator_size", index.size.get(creator, default_value = 0))
+        index.ids[sp.pair(creator, size.value)] = id
+        index.slots[id] = size.value
+        index.size[creator] = size.value + 1
+
+    def remove(self, index, creator, id):
+        slot = sp.local("creator_slot", index.slots[id])
+        last = sp.local("creator_last", sp.as_nat(index.size[creator] - 1))
+        sp.if slot.value != last.value:
+            moved = sp.local("creator_moved", index.ids[sp.pair(creator, last.value)])
+            index.ids[sp.pair(creator, slot.value)] = moved.value
+            index.slots[moved.value] = slot.value
+        del index.ids[sp.pair(creator, last.value)]
+        del index.slots[id]
+        sp.if last.value == 0:
+            del index.size[creator]
+        sp.else:
+            index.size[creator] = last.value
+
+    def page(self, index, params, row):
+        # The rows `row(id)` of the ids in slots [offset, offset + limit).
+        rows = sp.local("rows", [])
+        end = sp.local("end", sp.min(params.offset + params.limit,
+                                     index.size.get(params.creator, default_value = 0)))
+        i = sp.local("i", params.offset)
+        sp.while i.value < end.value:
+            rows.value.push(row(index.ids[sp.pair(params.creator, i.value)]))
+            i.value += 1
+        return rows.value.rev()
@@ -0,0 +1,267 @@
+"""Merkle trees of curation results, built offline.
+
+In a curation round the curators sign their votes off-chain. The relayer
+tallies them, builds the tree of the approved art proposals with this
+module and posts its root with `MainContract.post_curation_root`. Each artist
+then claims their mint with `art_mint_with_proof`, passing the proof of
+their proposal.
+
+The leaves and nodes match `MainContract.check_merkle_proof`:
+
+    leaf = blake2b(pack(Pair round proposal_id))
+    node = blake2b(min(left, right) + max(left, right))
+
+A node without a sibling moves up a level unchanged.
+
+    python curation_merkle.py --round 3 --approved 1 4 7
+    python curation_merkle.py --round 3 --votes votes.json --min-voting-percent 40
+
+where votes.json maps proposal ids to {curator address: ballot} objects,
+each ballot holding the vote and its proof:
+
+    {"in_favour": true, "public_key": "edpk...", "signature": "edsig..."}
+
+A curator signs the vote as `octez-client sign bytes` does, i.e. the ed25519
+signature of the blake2b hash of `pack(Pair round (Pair proposal_id
+in_favour))`. A ballot counts only if its key hashes to the curator's tz1
+address, the signature checks out and, with `--curators`, the address is a
+curator; any other ballot stops the tally with an error.
+"""
+
+import argparse
+import hashlib
+import json
+
+
+def zarith(n):
+    """Michelson binary encoding of a natural number."""
+    out = bytearray([n & 0x3F])
+    n >>= 6
+    while n:
+        out[-1] |= 0x80
+        out.append(n & 0x7F)
+        n >>= 7
+    return bytes(out)
+
+
+def pack_nat(n):
+    return b"\x05\x00" + zarith(n)
+
+
+def pack_pair(a, b):
+    """`PACK` of `Pair a b` for two nats."""
+    return b"\x05\x07\x07\x00" + zarith(a) + b"\x00" + zarith(b)
+
+
+def pack_vote(round_, proposal_id, in_favour):
+    """`PACK` of `Pair round (Pair proposal_id in_favour)`."""
+    return (b"\x05\x07\x07\x00" + zarith(round_) + b"\x07\x07\x00" + zarith(proposal_id)
+            + (b"\x03\x0a" if in_favour else b"\x03\x03"))
+
+
+def blake2b(data):
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+
+def leaf(round_, proposal_id):
+    return blake2b(pack_pair(round_, proposal_id))
+
+
+def node(a, b):
+    return blake2b(a + b if a < b else b + a)
+
+
+class Tree:
+    """The Merkle tree of the proposals approved in a round."""
+
+    def __init__(self, round_, proposal_ids):
+        if not proposal_ids:
+            raise ValueError("a curation round needs at least one approved proposal")
+        self.round = round_
+        self.proposal_ids = sorted(set(proposal_ids))
+        self.levels = [[leaf(round_, i) for i in self.proposal_ids]]
+        while len(self.levels[-1]) > 1:
+            below = self.levels[-1]
+            level = [node(below[i], below[i + 1]) for i in range(0, len(below) - 1, 2)]
+            if len(below) % 2:
+                level.append(below[-1])
+            self.levels.append(level)
+
+    @property
+    def root(self):
+        return self.levels[-1][0]
+
+    def proof(self, proposal_id):
+        """The siblings of the leaf of `proposal_id`, from the leaf up."""
+        index = self.proposal_ids.index(proposal_id)
+        siblings = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                siblings.append(level[sibling])
+            index //= 2
+        return siblings
+
+
+def verify(round_, proposal_id, proof, root):
+    """Python counterpart of `MainContract.check_merkle_proof`."""
+    current = leaf(round_, proposal_id)
+    for sibling in proof:
+        current = node(current, sibling)
+    return current == root
+
+
+# Signed votes
+##
+# Base58check keys and signatures as printed by octez-client, and a plain
+# RFC 8032 ed25519 verification so that the tool needs no dependency.
+
+ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+TZ1_PREFIX = b"\x06\xa1\x9f"
+EDPK_PREFIX = b"\x0d\x0f\x25\xd9"
+EDSIG_PREFIX = b"\x09\xf5\xcd\x86\x12"
+
+
+def b58check_decode(text, prefix):
+    n = 0
+    for c in text:
+        if c not in ALPHABET:
+            raise ValueError("invalid base58 string: %s" % text)
+        n = n * 58 + ALPHABET.index(c)
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    raw = b"\x00" * (len(text) - len(text.lstrip("1"))) + raw
+    payload, check = raw[:-4], raw[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != check:
+        raise ValueError("bad checksum: %s" % text)
+    if not payload.startswith(prefix):
+        raise ValueError("unexpected prefix: %s" % text)
+    return payload[len(prefix):]
+
+
+Q = 2 ** 255 - 19
+L = 2 ** 252 + 27742317777372353535851937790883648493
+D = -121665 * pow(121666, Q - 2, Q) % Q
+SQRT_M1 = pow(2, (Q - 1) // 4, Q)
+
+
+def recover_x(y, sign):
+    if y >= Q:
+        return None
+    x2 = (y * y - 1) * pow(D * y * y + 1, Q - 2, Q) % Q
+    if x2 == 0:
+        return None if sign else 0
+    x = pow(x2, (Q + 3) // 8, Q)
+    if (x * x - x2) % Q:
+        x = x * SQRT_M1 % Q
+    if (x * x - x2) % Q:
+        return None
+    return Q - x if (x & 1) != sign else x
+
+
+def point_add(a, b):
+    # Extended coordinates (X, Y, Z, T) with x = X/Z, y = Y/Z, x*y = T/Z.
+    e = (a[1] - a[0]) * (b[1] - b[0]) % Q
+    f = (a[1] + a[0]) * (b[1] + b[0]) % Q
+    g = 2 * a[3] * b[3] * D % Q
+    h = 2 * a[2] * b[2] % Q
+    e, f, g, h = f - e, h - g, h + g, f + e
+    return (e * f % Q, g * h % Q, f * g % Q, e * h % Q)
+
+
+def point_mul(n, point):
+    result = (0, 1, 1, 0)
+    while n:
+        if n & 1:
+            result = point_add(result, point)
+        point = point_add(point, point)
+        n >>= 1
+    return result
+
+
+def point_equal(a, b):
+    return (a[0] * b[2] - b[0] * a[2]) % Q == 0 and (a[1] * b[2] - b[1] * a[2]) % Q == 0
+
+
+def decompress(data):
+    y = int.from_bytes(data, "little")
+    x = recover_x(y & ((1 << 255) - 1), y >> 255)
+    if x is None:
+        return None
+    y &= (1 << 255) - 1
+    return (x, y, 1, x * y % Q)
+
+
+BASE = decompress((4 * pow(5, Q - 2, Q) % Q).to_bytes(32, "little"))
+
+
+def ed25519_verify(public_key, message, signature):
+    if len(public_key) != 32 or len(signature) != 64:
+        return False
+    a = decompress(public_key)
+    r = decompress(signature[:32])
+    s = int.from_bytes(signature[32:], "little")
+    if a is None or r is None or s >= L:
+        return False
+    h = int.from_bytes(hashlib.sha512(signature[:32] + public_key + message).digest(), "little") % L
+    return point_equal(point_mul(s, BASE), point_add(r, point_mul(h, a)))
+
+
+def check_ballot(round_, proposal_id, curator, ballot):
+    """Raises ValueError unless `ballot` is `curator`'s signed vote on
+    `proposal_id` in `round_`."""
+    public_key = b58check_decode(ballot["public_key"], EDPK_PREFIX)
+    if hashlib.blake2b(public_key, digest_size=20).digest() != b58check_decode(curator, TZ1_PREFIX):
+        raise ValueError("the key of %s's vote on proposal %d is not theirs" % (curator, proposal_id))
+    signature = b58check_decode(ballot["signature"], EDSIG_PREFIX)
+    message = blake2b(pack_vote(round_, proposal_id, ballot["in_favour"]))
+    if not ed25519_verify(public_key, message, signature):
+        raise ValueError("bad signature on %s's vote on proposal %d" % (curator, proposal_id))
+
+
+def approved(round_, votes, min_voting_percent, curators=None):
+    """The proposals that pass with the rule of `art_mint`: at least one vote
+    and at least `min_voting_percent` percent of them in favour.
+
+    `votes` maps proposal ids to {curator: ballot} dictionaries, so every
+    curator is counted once per proposal. Every ballot is checked with
+    `check_ballot`, and against `curators` if given.
+    """
+    result = []
+    for proposal_id, ballots in votes.items():
+        proposal_id = int(proposal_id)
+        for curator, ballot in ballots.items():
+            if curators is not None and curator not in curators:
+                raise ValueError("%s voted on proposal %d but is not a curator" % (curator, proposal_id))
+            check_ballot(round_, proposal_id, curator, ballot)
+        in_favour = sum(1 for ballot in ballots.values() if ballot["in_favour"])
+        if ballots and in_favour * 100 // len(ballots) >= min_voting_percent:
+            result.append(proposal_id)
+    return sorted(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merkle root and proofs of a curation round")
+    parser.add_argument("--round", type=int, required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--approved", type=int, nargs="+", help="ids of the approved proposals")
+    source.add_argument("--votes", help="JSON file of the signed votes")
+    parser.add_argument("--min-voting-percent", type=int, default=40)
+    parser.add_argument("--curators", nargs="+", help="addresses allowed to vote (the contract's curators)")
+    args = parser.parse_args(argv)
+
+    if args.votes:
+        with open(args.votes) as f:
+            proposal_ids = approved(args.round, json.load(f), args.min_voting_percent,
+                                    set(args.curators) if args.curators else None)
+    else:
+        proposal_ids = args.approved
+    tree = Tree(args.round, proposal_ids)
+    print(json.dumps({
+        "round": tree.round,
+        "root": tree.root.hex(),
+        "proofs": dict((str(i), [h.hex() for h in tree.proof(i)]) for i in tree.proposal_ids),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
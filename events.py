@@ -0,0 +1,131 @@
+import smartpy as sp
+
+# Event schema
+##
+# Every state change of the Marketplace, Auction and FA2 contracts, and every
+# curation result and lazy-mint sale of the curation contract, emits one of the
+# events below. Each event has an explicit tag and a typed payload laid out
+# as a right comb in the order the fields are declared here, so
+# that indexers can decode them without fetching contract storage and can
+# rebuild the full state from the events alone.
+##
+
+
+def comb(names):
+    if len(names) == 1:
+        return names[0]
+    return (names[0], comb(names[1:]))
+
+
+class Event:
+    def __init__(self, tag, **fields):
+        self.tag = tag
+        self.names = list(fields.keys())
+        self.fields = fields
+
+    def get_type(self):
+        t = sp.TRecord(**self.fields)
+        if len(self.names) > 1:
+            t = t.layout(comb(self.names))
+        return t
+
+    def emit(self, **values):
+        sp.emit(sp.set_type_expr(sp.record(**values), self.get_type()),
+                tag = self.tag, with_type = True)
+
+
+token_type = sp.TRecord(address = sp.TAddress, token_id = sp.TNat)
+shares_type = sp.TList(sp.TRecord(recipient = sp.TAddress, amount = sp.TNat))
+
+# Shared by Marketplace and Auction
+
+MODERATOR_ADDED = Event("MODERATOR_ADDED", moderator = sp.TAddress)
+MODERATOR_REMOVED = Event("MODERATOR_REMOVED", moderator = sp.TAddress)
+UPDATE_PLATFORM_FEES = Event("UPDATE_PLATFORM_FEES", platform_fees = sp.TNat)
+PAUSE_TOGGLED = Event("PAUSE_TOGGLED", pause = sp.TBool)
+BALANCE_CREDITED = Event("BALANCE_CREDITED", recipient = sp.TAddress, amount = sp.TMutez)
+BALANCE_WITHDRAWN = Event("BALANCE_WITHDRAWN", recipient = sp.TAddress, amount = sp.TMutez)
+SPLIT_REGISTERED = Event("SPLIT_REGISTERED", split_id = sp.TNat, shares = shares_type)
+
+# Marketplace
+
+ASK_CREATED = Event("ASK_CREATED",
+                    ask_id = sp.TNat,
+                    creator = sp.TAddress,
+                    token = token_type,
+                    amount = sp.TMutez,
+                    editions = sp.TNat,
+                    expiry_time = sp.TOption(sp.TTimestamp),
+                    split_id = sp.TNat)
+ASK_FULFILLED = Event("ASK_FULFILLED",
+                      ask_id = sp.TNat,
+                      buyer = sp.TAddress,
+                      quantity = sp.TNat,
+                      amount = sp.TMutez)
+ASK_RETRACTED = Event("ASK_RETRACTED", ask_id = sp.TNat)
+ASK_EXPIRED = Event("ASK_EXPIRED", ask_id = sp.TNat)
+SIGNED_ASK_FULFILLED = Event("SIGNED_ASK_FULFILLED",
+                             order_hash = sp.TBytes,
+                             creator = sp.TAddress,
+                             token = token_type,
+                             buyer = sp.TAddress,
+                             quantity = sp.TNat,
+                             amount = sp.TMutez)
+SIGNED_ASK_CANCELED = Event("SIGNED_ASK_CANCELED", order_hash = sp.TBytes)
+OFFER_CREATED = Event("OFFER_CREATED",
+                      offer_id = sp.TNat,
+                      creator = sp.TAddress,
+                      token = token_type,
+                      amount = sp.TMutez,
+                      expiry_time = sp.TOption(sp.TTimestamp),
+                      split_id = sp.TNat)
+OFFER_FULFILLED = Event("OFFER_FULFILLED", offer_id = sp.TNat, seller = sp.TAddress)
+OFFER_RETRACTED = Event("OFFER_RETRACTED", offer_id = sp.TNat)
+OFFER_EXPIRED = Event("OFFER_EXPIRED", offer_id = sp.TNat)
+
+# Auction
+
+AUCTION_CREATED = Event("AUCTION_CREATED",
+                        auction_id = sp.TNat,
+                        creator = sp.TAddress,
+                        token = token_type,
+                        start_time = sp.TTimestamp,
+                        end_time = sp.TTimestamp,
+                        price_increment = sp.TMutez,
+                        current_price = sp.TMutez,
+                        split_id = sp.TNat)
+NEW_BID = Event("NEW_BID", auction_id = sp.TNat, bidder = sp.TAddress, amount = sp.TMutez)
+AUCTION_CANCELED = Event("AUCTION_CANCELED", auction_id = sp.TNat)
+AUCTION_SETTLED = Event("AUCTION_SETTLED", auction_id = sp.TNat)
+
+# Curation
+
+CURATION_ROOT_POSTED = Event("CURATION_ROOT_POSTED", round = sp.TNat, root = sp.TBytes)
+
+LAZY_LISTING_CREATED = Event("LAZY_LISTING_CREATED",
+                             proposal_id = sp.TNat,
+                             artist = sp.TAddress,
+                             price = sp.TMutez,
+                             editions = sp.TNat)
+LAZY_MINTED = Event("LAZY_MINTED",
+                    proposal_id = sp.TNat,
+                    token = token_type,
+                    artist = sp.TAddress,
+                    buyer = sp.TAddress,
+                    amount = sp.TMutez)
+
+# FA2
+
+TRANSFER = Event("TRANSFER", from_ = sp.TAddress, to_ = sp.TAddress, token_id = sp.TNat, amount = sp.TNat)
+MINT = Event("MINT",
+             token_id = sp.TNat,
+             address = sp.TAddress,
+             amount = sp.TNat,
+             token_info = sp.TMap(sp.TString, sp.TBytes))
+OPERATOR_ADDED = Event("OPERATOR_ADDED", owner = sp.TAddress, operator = sp.TAddress, token_id = sp.TNat)
+OPERATOR_REMOVED = Event("OPERATOR_REMOVED", owner = sp.TAddress, operator = sp.TAddress, token_id = sp.TNat)
+OPERATOR_FOR_ALL_ADDED = Event("OPERATOR_FOR_ALL_ADDED", owner = sp.TAddress, operator = sp.TAddress)
+OPERATOR_FOR_ALL_REMOVED = Event("OPERATOR_FOR_ALL_REMOVED", owner = sp.TAddress, operator = sp.TAddress)
+ADMINISTRATOR_SET = Event("ADMINISTRATOR_SET", administrator = sp.TAddress)
+PAUSE_SET = Event("PAUSE_SET", pause = sp.TBool)
+METADATA_SET = Event("METADATA_SET", key = sp.TString, value = sp.TBytes)
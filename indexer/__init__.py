@@ -0,0 +1,17 @@
+"""Offline indexer for the events emitted by the NFTBiennial contracts.
+
+Events are read from a feed of Tezos blocks (RPC JSON, one block per line or
+one file per block), decoded from Micheline and folded into SQLite views of
+open asks, offers, auctions and the sales history. Progress is checkpointed
+per block so that a run can be interrupted and resumed.
+
+    python -m indexer run --feed blocks.jsonl --db index.sqlite
+    python -m indexer bench --events 100000
+"""
+
+from .feed import Event, FileFeed, events_of_block
+from .micheline import decode
+from .store import Store
+from .indexer import Indexer
+
+__all__ = ["Event", "FileFeed", "Indexer", "Store", "decode", "events_of_block"]
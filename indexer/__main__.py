@@ -0,0 +1,36 @@
+import argparse
+
+from . import bench
+from .feed import FileFeed
+from .indexer import Indexer
+from .store import Store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m indexer", description="NFTBiennial event indexer")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="index a block feed into SQLite")
+    run.add_argument("--feed", required=True, help="JSON-lines file or directory of block JSON files")
+    run.add_argument("--db", required=True, help="SQLite database to update")
+    run.add_argument("--name", default="default", help="checkpoint name of this feed")
+    run.add_argument("--contract", action="append", help="only index events from this address (repeatable)")
+
+    measure = commands.add_parser("bench", help="measure indexing throughput on a synthetic feed")
+    measure.add_argument("--events", type=int, default=100000)
+    measure.add_argument("--ops-per-block", type=int, default=20)
+    measure.add_argument("--db", default=":memory:")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        store = Store(args.db)
+        count = Indexer(store, args.contract).run(FileFeed(args.feed), args.name)
+        print("indexed %d events, checkpoint at level %d" % (count, store.checkpoint(args.name)))
+        store.close()
+    else:
+        count, elapsed = bench.run(args.events, args.ops_per_block, args.db)
+        print("%d events in %.3f s: %.0f events/s" % (count, elapsed, count / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Synthetic feed and throughput benchmark for the indexer.
+
+`synthetic_blocks` builds RPC-shaped blocks whose events follow the shapes
+the contracts emit: asks created and filled, offers created and filled,
+auctions created, bid on and settled.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from .feed import FileFeed
+from .indexer import Indexer
+from .store import Store
+
+MARKETPLACE = "KT1Tezooo1zzSmartPyzzSTATiCzzzyfC8eF"
+AUCTION = "KT1TezoooozzSmartPyzzDYNAMiCzzpLu4LU"
+TOKEN = "KT1Tezooo2zzSmartPyzzSTATiCzzzwqqQ4H"
+ALICE = "tz1QXAR4RsVTXYU75XBU9ctMYkWYFnZYbgzk"
+BOB = "tz1hJgZdhnRGvg5XD6pYxRCsbWh4jg5HQ476"
+
+
+def field(prim, name, *args):
+    node = {"prim": prim, "annots": ["%" + name]}
+    if args:
+        node["args"] = list(args)
+    return node
+
+
+def pair(*args):
+    return {"prim": "Pair", "args": list(args)}
+
+
+def string(s):
+    return {"string": s}
+
+
+def int_(n):
+    return {"int": str(n)}
+
+
+def comb(*fields):
+    return {"prim": "pair", "args": list(fields)}
+
+
+def none():
+    return {"prim": "None"}
+
+
+def some(value):
+    return {"prim": "Some", "args": [value]}
+
+
+TOKEN_TYPE = field("pair", "token", field("address", "address"), field("nat", "token_id"))
+SPLIT_TYPE = field("nat", "split_id")
+EXPIRY_TYPE = field("option", "expiry_time", {"prim": "timestamp"})
+
+TYPES = {
+    "ASK_CREATED": comb(field("nat", "ask_id"), field("address", "creator"), TOKEN_TYPE, field("mutez", "amount"),
+                        field("nat", "editions"), EXPIRY_TYPE, SPLIT_TYPE),
+    "ASK_FULFILLED": comb(field("nat", "ask_id"), field("address", "buyer"), field("nat", "quantity"),
+                          field("mutez", "amount")),
+    "OFFER_CREATED": comb(field("nat", "offer_id"), field("address", "creator"), TOKEN_TYPE, field("mutez", "amount"),
+                          EXPIRY_TYPE, SPLIT_TYPE),
+    "OFFER_FULFILLED": comb(field("nat", "offer_id"), field("address", "seller")),
+    "AUCTION_CREATED": comb(field("nat", "auction_id"), field("address", "creator"), TOKEN_TYPE,
+                            field("timestamp", "start_time"), field("timestamp", "end_time"),
+                            field("mutez", "price_increment"), field("mutez", "current_price"), SPLIT_TYPE),
+    "ASK_EXPIRED": field("nat", "ask_id"),
+    "OFFER_EXPIRED": field("nat", "offer_id"),
+    "NEW_BID": comb(field("nat", "auction_id"), field("address", "bidder"), field("mutez", "amount")),
+    "AUCTION_SETTLED": field("nat", "auction_id"),
+    "BALANCE_CREDITED": comb(field("address", "recipient"), field("mutez", "amount")),
+    "BALANCE_WITHDRAWN": comb(field("address", "recipient"), field("mutez", "amount")),
+}
+
+
+def event(source, tag, payload):
+    return {"kind": "event", "source": source, "nonce": 0, "type": TYPES[tag], "tag": tag,
+            "payload": payload, "result": {"status": "applied"}}
+
+
+def operation(source, destination, amount, events):
+    return {
+        "hash": "op%d" % id(events),
+        "contents": [{
+            "kind": "transaction", "source": source, "destination": destination, "amount": str(amount),
+            "metadata": {"operation_result": {"status": "applied"}, "internal_operation_results": events},
+        }],
+    }
+
+
+def synthetic_operations():
+    """Yields operations forever, cycling through the marketplace and auction
+    flows. Filling an ask emits two events, every other operation one."""
+    ask_id = offer_id = auction_id = 0
+    step = 0
+    while True:
+        kind = step % 8
+        token = pair(string(TOKEN), int_(step % 1000))
+        if kind == 0:
+            ops = operation(ALICE, MARKETPLACE, 0, [event(MARKETPLACE, "ASK_CREATED",
+                            pair(int_(ask_id), string(ALICE), token, int_(1000000), int_(1), none(), int_(0)))])
+        elif kind == 1:
+            ops = operation(BOB, MARKETPLACE, 1000000, [
+                event(MARKETPLACE, "ASK_FULFILLED", pair(int_(ask_id), string(BOB), int_(1), int_(1000000))),
+                event(MARKETPLACE, "BALANCE_CREDITED", pair(string(ALICE), int_(1000000)))])
+            ask_id += 1
+        elif kind == 2:
+            ops = operation(BOB, MARKETPLACE, 2000000, [event(MARKETPLACE, "OFFER_CREATED",
+                            pair(int_(offer_id), string(BOB), token, int_(2000000), none(), int_(0)))])
+        elif kind == 3:
+            ops = operation(ALICE, MARKETPLACE, 0, [event(MARKETPLACE, "OFFER_FULFILLED",
+                            pair(int_(offer_id), string(ALICE)))])
+            offer_id += 1
+        elif kind == 4:
+            ops = operation(ALICE, AUCTION, 0, [event(AUCTION, "AUCTION_CREATED",
+                            pair(int_(auction_id), string(ALICE), token, int_(0), int_(86400),
+                                 int_(100000), int_(0), int_(0)))])
+        elif kind in (5, 6):
+            ops = operation(BOB, AUCTION, 1000000 * kind, [event(AUCTION, "NEW_BID",
+                            pair(int_(auction_id), string(BOB), int_(1000000 * kind)))])
+        else:
+            ops = operation(ALICE, AUCTION, 0, [event(AUCTION, "AUCTION_SETTLED", int_(auction_id))])
+            auction_id += 1
+        yield ops
+        step += 1
+
+
+def synthetic_blocks(events, ops_per_block=20):
+    """Yields blocks of `ops_per_block` operations emitting `events` events
+    in total; the last operation is cut short if needed."""
+    operations = synthetic_operations()
+    level = 1
+    while events > 0:
+        block = []
+        while events > 0 and len(block) < ops_per_block:
+            ops = next(operations)
+            results = ops["contents"][0]["metadata"]["internal_operation_results"]
+            del results[events:]
+            events -= len(results)
+            block.append(ops)
+        yield {"header": {"level": level, "timestamp": "2024-01-01T00:00:00Z"},
+               "operations": [[], [], [], block]}
+        level += 1
+
+
+def write_feed(path, blocks):
+    with open(path, "w") as f:
+        for block in blocks:
+            f.write(json.dumps(block))
+            f.write("\n")
+
+
+def run(events, ops_per_block=20, db=":memory:"):
+    """Indexes `events` synthetic events from a file feed; returns
+    (events, seconds)."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "feed.jsonl")
+        write_feed(path, synthetic_blocks(events, ops_per_block))
+        store = Store(db)
+        start = time.perf_counter()
+        count = Indexer(store).run(FileFeed(path), "bench")
+        elapsed = time.perf_counter() - start
+        store.close()
+    return count, elapsed
@@ -0,0 +1,78 @@
+"""Block feeds and event extraction.
+
+A feed yields Tezos blocks as returned by the node RPC
+(`/chains/main/blocks/<level>`). `FileFeed` is the offline stand-in: it reads
+either a JSON-lines file with one block per line, or a directory holding one
+`<level>.json` file per block.
+"""
+
+import collections
+import glob
+import json
+import os
+
+from .micheline import decode
+
+Event = collections.namedtuple(
+    "Event", ["level", "timestamp", "operation", "contract", "tag", "payload", "sender", "amount"])
+
+
+class FileFeed:
+    def __init__(self, path):
+        self.path = path
+
+    def blocks(self, after_level=-1):
+        """Yields the blocks whose level is above `after_level`, in order."""
+        if os.path.isdir(self.path):
+            files = glob.glob(os.path.join(self.path, "*.json"))
+            for name in sorted(files, key=lambda f: int(os.path.basename(f).split(".")[0])):
+                if int(os.path.basename(name).split(".")[0]) <= after_level:
+                    continue
+                with open(name) as f:
+                    yield json.load(f)
+        else:
+            with open(self.path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    block = json.loads(line)
+                    if block["header"]["level"] > after_level:
+                        yield block
+
+
+def applied(result):
+    return result is not None and result.get("status") == "applied"
+
+
+def events_of_block(block, contracts=None):
+    """Extracts the applied contract events of a block, in operation order.
+
+    `contracts`, if given, restricts the events to those emitted by these
+    addresses. The sender and amount of the transaction that emitted the
+    event are kept alongside, since several entry points are paid for.
+    """
+    level = block["header"]["level"]
+    moment = block["header"]["timestamp"]
+    for operations in block.get("operations", []):
+        for operation in operations:
+            for content in operation.get("contents", []):
+                metadata = content.get("metadata", {})
+                if content.get("kind") == "transaction" and not applied(metadata.get("operation_result")):
+                    continue
+                calls = {}
+                if content.get("kind") == "transaction":
+                    calls[content["destination"]] = (content["source"], int(content.get("amount", "0")))
+                for internal in metadata.get("internal_operation_results", []):
+                    if not applied(internal.get("result")):
+                        continue
+                    if internal["kind"] == "transaction":
+                        calls[internal["destination"]] = (internal["source"], int(internal.get("amount", "0")))
+                        continue
+                    if internal["kind"] != "event":
+                        continue
+                    if contracts is not None and internal["source"] not in contracts:
+                        continue
+                    payload = decode(internal["type"], internal["payload"]) if "payload" in internal else None
+                    sender, amount = calls.get(internal["source"], (None, 0))
+                    yield Event(level, moment, operation.get("hash"), internal["source"],
+                                internal.get("tag"), payload, sender, amount)
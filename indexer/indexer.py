@@ -0,0 +1,180 @@
+"""Folding contract events into the SQLite views."""
+
+import json
+
+from .feed import events_of_block
+
+
+class Indexer:
+    """Applies events to a `Store`.
+
+    Handlers are looked up by event tag (`on_<TAG>`); events with no handler
+    (moderator changes, fee updates, operators...) are skipped.
+    """
+
+    def __init__(self, store, contracts=None):
+        self.store = store
+        self.contracts = set(contracts) if contracts else None
+
+    def run(self, feed, name="default", commit_every=100):
+        """Indexes every block of `feed` past the checkpoint of `name`.
+
+        The checkpoint is written in the same transaction as the views, so an
+        interrupted run resumes from the last committed block. Returns the
+        number of events applied.
+        """
+        count = 0
+        pending = 0
+        for block in feed.blocks(self.store.checkpoint(name)):
+            for event in events_of_block(block, self.contracts):
+                self.apply(event)
+                count += 1
+            self.store.set_checkpoint(name, block["header"]["level"])
+            pending += 1
+            if pending >= commit_every:
+                self.store.commit()
+                pending = 0
+        self.store.commit()
+        return count
+
+    def apply(self, event):
+        handler = getattr(self, "on_" + (event.tag or ""), None)
+        if handler is not None:
+            handler(event, event.payload)
+
+    def sale(self, event, kind, ref_id, token_address, token_id, seller, buyer, price, quantity):
+        self.store.execute(
+            "INSERT INTO sales (contract, level, timestamp, operation, kind, ref_id, token_address, token_id,"
+            " seller, buyer, price, quantity) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (event.contract, event.level, event.timestamp, event.operation, kind, ref_id,
+             token_address, token_id, seller, buyer, price, quantity))
+
+    # Marketplace: asks
+
+    def on_ASK_CREATED(self, event, p):
+        self.store.execute(
+            "INSERT OR REPLACE INTO asks (contract, ask_id, creator, token_address, token_id, price, editions,"
+            " expiry_time, created_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (event.contract, p["ask_id"], p["creator"], p["token"]["address"], p["token"]["token_id"],
+             p["amount"], p["editions"], p["expiry_time"], event.level))
+
+    def on_ASK_FULFILLED(self, event, p):
+        row = self.store.execute(
+            "SELECT creator, token_address, token_id, editions FROM asks WHERE contract = ? AND ask_id = ?",
+            (event.contract, p["ask_id"])).fetchone()
+        if row is None:
+            return
+        creator, token_address, token_id, editions = row
+        self.sale(event, "ask", p["ask_id"], token_address, token_id, creator, p["buyer"],
+                  p["amount"], p["quantity"])
+        if editions <= p["quantity"]:
+            self.store.execute("DELETE FROM asks WHERE contract = ? AND ask_id = ?", (event.contract, p["ask_id"]))
+        else:
+            self.store.execute("UPDATE asks SET editions = ? WHERE contract = ? AND ask_id = ?",
+                               (editions - p["quantity"], event.contract, p["ask_id"]))
+
+    def on_ASK_RETRACTED(self, event, p):
+        self.store.execute("DELETE FROM asks WHERE contract = ? AND ask_id = ?", (event.contract, p["ask_id"]))
+
+    on_ASK_EXPIRED = on_ASK_RETRACTED
+
+    def on_SIGNED_ASK_FULFILLED(self, event, p):
+        # Signed asks only reach the chain when filled: there is no open ask
+        # row to update.
+        self.sale(event, "signed_ask", None, p["token"]["address"], p["token"]["token_id"], p["creator"],
+                  p["buyer"], p["amount"], p["quantity"])
+
+    # Curation: lazy minting
+
+    def on_LAZY_MINTED(self, event, p):
+        # The edition is minted to the buyer by the sale itself; the FA2 MINT
+        # event updates the ledger.
+        self.sale(event, "lazy_mint", p["proposal_id"], p["token"]["address"], p["token"]["token_id"], p["artist"],
+                  p["buyer"], p["amount"], 1)
+
+    # Marketplace: offers
+
+    def on_OFFER_CREATED(self, event, p):
+        self.store.execute(
+            "INSERT OR REPLACE INTO offers (contract, offer_id, creator, token_address, token_id, price,"
+            " expiry_time, created_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (event.contract, p["offer_id"], p["creator"], p["token"]["address"], p["token"]["token_id"],
+             p["amount"], p["expiry_time"], event.level))
+
+    def on_OFFER_FULFILLED(self, event, p):
+        row = self.store.execute(
+            "SELECT creator, token_address, token_id, price FROM offers WHERE contract = ? AND offer_id = ?",
+            (event.contract, p["offer_id"])).fetchone()
+        if row is not None:
+            creator, token_address, token_id, price = row
+            self.sale(event, "offer", p["offer_id"], token_address, token_id, p["seller"], creator, price, 1)
+        self.store.execute("DELETE FROM offers WHERE contract = ? AND offer_id = ?", (event.contract, p["offer_id"]))
+
+    def on_OFFER_RETRACTED(self, event, p):
+        self.store.execute("DELETE FROM offers WHERE contract = ? AND offer_id = ?", (event.contract, p["offer_id"]))
+
+    # The refund of an expired offer is recorded by its BALANCE_CREDITED event.
+    on_OFFER_EXPIRED = on_OFFER_RETRACTED
+
+    # Auctions
+
+    def on_AUCTION_CREATED(self, event, p):
+        self.store.execute(
+            "INSERT OR REPLACE INTO auctions (contract, auction_id, creator, token_address, token_id, start_time,"
+            " end_time, current_price, highest_bidder, created_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (event.contract, p["auction_id"], p["creator"], p["token"]["address"], p["token"]["token_id"],
+             p["start_time"], p["end_time"], p["current_price"], p["creator"], event.level))
+
+    def on_NEW_BID(self, event, p):
+        self.store.execute(
+            "UPDATE auctions SET current_price = ?, highest_bidder = ? WHERE contract = ? AND auction_id = ?",
+            (p["amount"], p["bidder"], event.contract, p["auction_id"]))
+
+    def on_AUCTION_CANCELED(self, event, p):
+        self.store.execute("DELETE FROM auctions WHERE contract = ? AND auction_id = ?",
+                           (event.contract, p["auction_id"]))
+
+    def on_AUCTION_SETTLED(self, event, p):
+        row = self.store.execute(
+            "SELECT creator, token_address, token_id, current_price, highest_bidder FROM auctions"
+            " WHERE contract = ? AND auction_id = ?", (event.contract, p["auction_id"])).fetchone()
+        if row is not None:
+            creator, token_address, token_id, price, bidder = row
+            if bidder != creator:
+                self.sale(event, "auction", p["auction_id"], token_address, token_id, creator, bidder, price, 1)
+        self.store.execute("DELETE FROM auctions WHERE contract = ? AND auction_id = ?",
+                           (event.contract, p["auction_id"]))
+
+    # Withdrawable balances (Marketplace and Auction)
+
+    def add_balance(self, contract, address, amount):
+        self.store.execute(
+            "INSERT INTO balances (contract, address, amount) VALUES (?, ?, ?)"
+            " ON CONFLICT (contract, address) DO UPDATE SET amount = amount + excluded.amount",
+            (contract, address, amount))
+
+    def on_BALANCE_CREDITED(self, event, p):
+        self.add_balance(event.contract, p["recipient"], p["amount"])
+
+    def on_BALANCE_WITHDRAWN(self, event, p):
+        self.store.execute("DELETE FROM balances WHERE contract = ? AND address = ?",
+                           (event.contract, p["recipient"]))
+
+    # FA2
+
+    def add_tokens(self, contract, token_id, owner, amount):
+        self.store.execute(
+            "INSERT INTO ledger (contract, token_id, owner, balance) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (contract, token_id, owner) DO UPDATE SET balance = balance + excluded.balance",
+            (contract, token_id, owner, amount))
+
+    def on_MINT(self, event, p):
+        self.store.execute("INSERT OR IGNORE INTO tokens (contract, token_id, token_info) VALUES (?, ?, ?)",
+                           (event.contract, p["token_id"], json.dumps(dict(p["token_info"]), sort_keys=True)))
+        self.add_tokens(event.contract, p["token_id"], p["address"], p["amount"])
+
+    def on_TRANSFER(self, event, p):
+        self.add_tokens(event.contract, p["token_id"], p["from_"], -p["amount"])
+        self.add_tokens(event.contract, p["token_id"], p["to_"], p["amount"])
+        self.store.execute("DELETE FROM ledger WHERE contract = ? AND token_id = ? AND owner = ? AND balance = 0",
+                           (event.contract, p["token_id"], p["from_"]))
@@ -0,0 +1,120 @@
+"""Decoding of Micheline JSON values into plain Python values.
+
+Only what event payloads need is covered: records (annotated pairs),
+variants, options, lists, sets, maps and the usual scalar types.
+Records become dicts keyed by their field annotations, variants become
+single-key dicts, mutez and nats become ints, timestamps become ISO 8601
+strings and addresses are always returned in their base58 form.
+"""
+
+import datetime
+import hashlib
+
+ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+ADDRESS_PREFIXES = {
+    (0, 0): b"\x06\xa1\x9f",  # tz1
+    (0, 1): b"\x06\xa1\xa1",  # tz2
+    (0, 2): b"\x06\xa1\xa4",  # tz3
+}
+ORIGINATED_PREFIX = b"\x02\x5a\x79"  # KT1
+
+
+def b58check(payload):
+    payload += hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    n = int.from_bytes(payload, "big")
+    encoded = ""
+    while n > 0:
+        n, r = divmod(n, 58)
+        encoded = ALPHABET[r] + encoded
+    leading = len(payload) - len(payload.lstrip(b"\x00"))
+    return "1" * leading + encoded
+
+
+def address_of_bytes(raw):
+    if raw[0] == 0:
+        return b58check(ADDRESS_PREFIXES[(0, raw[1])] + raw[2:22])
+    return b58check(ORIGINATED_PREFIX + raw[1:21])
+
+
+def timestamp(value):
+    if "string" in value:
+        return value["string"]
+    seconds = int(value["int"])
+    moment = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def field_name(node):
+    for annot in node.get("annots", []):
+        if annot.startswith("%"):
+            return annot[1:]
+    return None
+
+
+def pair_args(node):
+    """The two components of a pair type or value, unfolding n-ary combs."""
+    args = node if isinstance(node, list) else node["args"]
+    if len(args) == 2:
+        return args
+    rest = {"prim": node["prim"] if isinstance(node, dict) else "Pair", "args": args[1:]}
+    return [args[0], rest]
+
+
+def record_fields(t, value, out):
+    """Collects the annotated leaves of a (possibly nested) pair into `out`."""
+    t_left, t_right = pair_args(t)
+    v_left, v_right = pair_args(value)
+    for t_child, v_child in ((t_left, v_left), (t_right, v_right)):
+        name = field_name(t_child)
+        if name is None and t_child.get("prim") == "pair":
+            record_fields(t_child, v_child, out)
+        else:
+            out[name if name is not None else str(len(out))] = decode(t_child, v_child, top=False)
+    return out
+
+
+def decode(t, value, top=True):
+    """Decodes `value` (Micheline JSON) according to the type `t`."""
+    prim = t["prim"]
+    if top and prim != "pair" and field_name(t) is not None:
+        # A single-field record is compiled to its annotated field.
+        return {field_name(t): decode(t, value, top=False)}
+    if prim == "pair":
+        return record_fields(t, value, {})
+    if prim in ("nat", "int", "mutez"):
+        return int(value["int"])
+    if prim == "timestamp":
+        return timestamp(value)
+    if prim in ("string", "key_hash", "key", "signature", "chain_id"):
+        return value.get("string", value.get("bytes"))
+    if prim == "address":
+        if "string" in value:
+            return value["string"]
+        return address_of_bytes(bytes.fromhex(value["bytes"][:44]))
+    if prim == "bytes":
+        return value["bytes"]
+    if prim == "bool":
+        return value["prim"] == "True"
+    if prim == "unit":
+        return None
+    if prim == "option":
+        if value["prim"] == "None":
+            return None
+        return decode(t["args"][0], value["args"][0], top=False)
+    if prim == "or":
+        branch = 0 if value["prim"] == "Left" else 1
+        t_branch = t["args"][branch]
+        name = field_name(t_branch)
+        inner = decode(t_branch, value["args"][0], top=False)
+        if name is None and t_branch.get("prim") == "or":
+            return inner
+        return {name if name is not None else str(branch): inner}
+    if prim in ("list", "set"):
+        return [decode(t["args"][0], v, top=False) for v in value]
+    if prim in ("map", "big_map"):
+        if not isinstance(value, list):
+            return value
+        return [(decode(t["args"][0], elt["args"][0], top=False),
+                 decode(t["args"][1], elt["args"][1], top=False)) for elt in value]
+    raise ValueError("unsupported Micheline type: %s" % prim)
@@ -0,0 +1,106 @@
+"""SQLite storage for the materialized views and the feed checkpoint."""
+
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoint (
+    feed TEXT PRIMARY KEY,
+    level INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS asks (
+    contract TEXT NOT NULL,
+    ask_id INTEGER NOT NULL,
+    creator TEXT,
+    token_address TEXT,
+    token_id INTEGER,
+    price INTEGER,
+    editions INTEGER,
+    expiry_time TEXT,
+    created_level INTEGER,
+    PRIMARY KEY (contract, ask_id)
+);
+CREATE TABLE IF NOT EXISTS offers (
+    contract TEXT NOT NULL,
+    offer_id INTEGER NOT NULL,
+    creator TEXT,
+    token_address TEXT,
+    token_id INTEGER,
+    price INTEGER,
+    expiry_time TEXT,
+    created_level INTEGER,
+    PRIMARY KEY (contract, offer_id)
+);
+CREATE TABLE IF NOT EXISTS auctions (
+    contract TEXT NOT NULL,
+    auction_id INTEGER NOT NULL,
+    creator TEXT,
+    token_address TEXT,
+    token_id INTEGER,
+    start_time TEXT,
+    end_time TEXT,
+    current_price INTEGER,
+    highest_bidder TEXT,
+    created_level INTEGER,
+    PRIMARY KEY (contract, auction_id)
+);
+CREATE INDEX IF NOT EXISTS auctions_by_token ON auctions (contract, token_address, token_id);
+CREATE TABLE IF NOT EXISTS sales (
+    contract TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    timestamp TEXT,
+    operation TEXT,
+    kind TEXT NOT NULL,
+    ref_id INTEGER,
+    token_address TEXT,
+    token_id INTEGER,
+    seller TEXT,
+    buyer TEXT,
+    price INTEGER,
+    quantity INTEGER
+);
+CREATE INDEX IF NOT EXISTS sales_by_token ON sales (token_address, token_id);
+CREATE TABLE IF NOT EXISTS balances (
+    contract TEXT NOT NULL,
+    address TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (contract, address)
+);
+CREATE TABLE IF NOT EXISTS ledger (
+    contract TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    owner TEXT NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (contract, token_id, owner)
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    contract TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    token_info TEXT,
+    PRIMARY KEY (contract, token_id)
+);
+"""
+
+
+class Store:
+    def __init__(self, path=":memory:"):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def checkpoint(self, feed):
+        row = self.db.execute("SELECT level FROM checkpoint WHERE feed = ?", (feed,)).fetchone()
+        return row[0] if row else -1
+
+    def set_checkpoint(self, feed, level):
+        self.db.execute("INSERT OR REPLACE INTO checkpoint (feed, level) VALUES (?, ?)", (feed, level))
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def execute(self, sql, args=()):
+        return self.db.execute(sql, args)
+
+    def close(self):
+        self.db.close()
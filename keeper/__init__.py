@@ -0,0 +1,17 @@
+"""Keeper for the NFTBiennial contracts.
+
+Follows the events of the Auction and Marketplace contracts through the
+indexer's block feed, keeps auction end times and listing expiries in a
+priority queue, and submits `settle_auctions` batches for ended auctions and
+`purge_expired` batches for expired asks and offers through a pluggable
+backend.
+
+    python -m keeper run --feed blocks/ --backend client --source keeper --follow
+    python -m keeper bench --auctions 10000 --offers 10000
+"""
+
+from .backends import Backend, ClientBackend, RecordingBackend
+from .keeper import Keeper
+from .schedule import Schedule, purge_time
+
+__all__ = ["Backend", "ClientBackend", "Keeper", "RecordingBackend", "Schedule"]
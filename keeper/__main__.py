@@ -0,0 +1,55 @@
+import argparse
+import logging
+
+from indexer.feed import FileFeed
+
+from . import bench
+from .backends import ClientBackend, RecordingBackend
+from .keeper import Keeper
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m keeper", description="NFTBiennial settlement keeper")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="settle ended auctions and purge expired listings")
+    run.add_argument("--feed", required=True, help="JSON-lines file or directory of block JSON files")
+    run.add_argument("--contract", action="append", help="only watch this address (repeatable)")
+    run.add_argument("--backend", choices=["dry-run", "client"], default="dry-run")
+    run.add_argument("--source", help="octez-client account paying for the operations")
+    run.add_argument("--max-batch", type=int, default=50)
+    run.add_argument("--retry-after", type=int, default=120, help="seconds before resubmitting an entry")
+    run.add_argument("--follow", action="store_true", help="keep polling the feed")
+    run.add_argument("--interval", type=int, default=10)
+
+    measure = commands.add_parser("bench", help="measure the keeper on a synthetic sale closing")
+    measure.add_argument("--auctions", type=int, default=10000)
+    measure.add_argument("--offers", type=int, default=10000)
+    measure.add_argument("--ops-per-block", type=int, default=20)
+    measure.add_argument("--max-batch", type=int, default=50)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    if args.command == "run":
+        if args.backend == "client":
+            if not args.source:
+                parser.error("--backend client needs --source")
+            backend = ClientBackend(args.source)
+        else:
+            backend = RecordingBackend()
+        keeper = Keeper(backend, args.contract, args.max_batch, args.retry_after)
+        level = keeper.run(FileFeed(args.feed), follow=args.follow, interval=args.interval)
+        print("read up to level %d, %d operations submitted, %d entries open"
+              % (level, keeper.submissions, len(keeper.schedule)))
+        if args.backend == "dry-run":
+            for call in backend.calls:
+                print(*call)
+    else:
+        entries, blocks, submissions, elapsed = bench.run(args.auctions, args.offers, args.ops_per_block,
+                                                          args.max_batch)
+        print("%d auctions and offers closed with %d operations over %d blocks in %.3f s"
+              % (entries, submissions, blocks, elapsed))
+
+
+if __name__ == "__main__":
+    main()
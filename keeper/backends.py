@@ -0,0 +1,60 @@
+"""Submission backends of the keeper.
+
+A backend turns the keeper's decisions into operations. It implements
+`settle_auctions(contract, auction_ids)` and
+`purge_expired(contract, buckets, limit)`, mirroring the entry points of the
+same names. It doesn't report what happened on-chain: the keeper learns it
+from the events of the feed. Exceptions are logged by the keeper, and the
+entries involved are retried on a later step.
+
+- `RecordingBackend` only records the calls (dry runs, benchmarks).
+- `ClientBackend` injects the operations with `octez-client`.
+- `keeper_simulation.py` defines `ScenarioBackend`, which applies them to
+  contracts originated in a SmartPy test scenario.
+"""
+
+import subprocess
+
+
+class Backend:
+    def settle_auctions(self, contract, auction_ids):
+        raise NotImplementedError
+
+    def purge_expired(self, contract, buckets, limit):
+        raise NotImplementedError
+
+
+class RecordingBackend(Backend):
+    def __init__(self):
+        self.calls = []
+
+    def settle_auctions(self, contract, auction_ids):
+        self.calls.append(("settle_auctions", contract, list(auction_ids)))
+
+    def purge_expired(self, contract, buckets, limit):
+        self.calls.append(("purge_expired", contract, list(buckets), limit))
+
+
+def michelson_list(values):
+    return "{ %s }" % " ; ".join(str(v) for v in values)
+
+
+class ClientBackend(Backend):
+    """Calls the contracts from the `source` account of an `octez-client`
+    configured for the target network."""
+
+    def __init__(self, source, client="octez-client", burn_cap="1"):
+        self.source = source
+        self.client = client
+        self.burn_cap = burn_cap
+
+    def call(self, contract, entry_point, arg):
+        subprocess.run([self.client, "transfer", "0", "from", self.source, "to", contract,
+                        "--entrypoint", entry_point, "--arg", arg, "--burn-cap", self.burn_cap],
+                       check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def settle_auctions(self, contract, auction_ids):
+        self.call(contract, "settle_auctions", michelson_list(auction_ids))
+
+    def purge_expired(self, contract, buckets, limit):
+        self.call(contract, "purge_expired", "Pair %s %d" % (michelson_list(buckets), limit))
@@ -0,0 +1,87 @@
+"""Synthetic load for the keeper.
+
+`synthetic_blocks` creates `auctions` auctions ending within ten minutes of
+each other, as at the close of a timed sale, each with one bid, and `offers`
+offers expiring over the following hours. Blocks are 15 seconds apart and
+keep coming until everything has ended. `ConfirmingBackend` stands in for
+the chain by closing each submitted entry right away, so the run measures
+the keeper's own scheduling and batching.
+"""
+
+import os
+import tempfile
+import time
+
+from indexer import bench
+from indexer.bench import ALICE, AUCTION, BOB, MARKETPLACE, TOKEN, event, int_, none, operation, pair, some, string
+from indexer.feed import FileFeed
+
+from .backends import RecordingBackend
+from .keeper import Keeper
+from .schedule import EXPIRY_BUCKET, purge_time
+
+START = 1704067200  # 2024-01-01T00:00:00Z
+BLOCK_TIME = 15
+
+
+def header(level):
+    moment = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(START + level * BLOCK_TIME))
+    return {"level": level, "timestamp": moment}
+
+
+def synthetic_blocks(auctions, offers, ops_per_block=20):
+    ends = [START + 3600 + i % 600 for i in range(auctions)]
+    expiries = [START + 1800 + (i * 7) % (4 * EXPIRY_BUCKET) for i in range(offers)]
+    calls = []
+    for i, end in enumerate(ends):
+        token = pair(string(TOKEN), int_(i))
+        calls.append(operation(ALICE, AUCTION, 0, [event(AUCTION, "AUCTION_CREATED",
+                     pair(int_(i), string(ALICE), token, int_(START), int_(end), int_(100000), int_(0), int_(0)))]))
+        calls.append(operation(BOB, AUCTION, 1000000, [event(AUCTION, "NEW_BID",
+                     pair(int_(i), string(BOB), int_(1000000)))]))
+    for i, expiry in enumerate(expiries):
+        token = pair(string(TOKEN), int_(i))
+        calls.append(operation(BOB, MARKETPLACE, 1000000, [event(MARKETPLACE, "OFFER_CREATED",
+                     pair(int_(i), string(BOB), token, int_(1000000), some(int_(expiry)), int_(0)))]))
+    level = 1
+    for i in range(0, len(calls), ops_per_block):
+        yield {"header": header(level), "operations": [[], [], [], calls[i:i + ops_per_block]]}
+        level += 1
+    last = max(ends + [purge_time(expiry) for expiry in expiries] + [START])
+    while START + level * BLOCK_TIME <= last + BLOCK_TIME:
+        yield {"header": header(level), "operations": [[], [], [], []]}
+        level += 1
+
+
+class ConfirmingBackend(RecordingBackend):
+    """Closes the submitted entries in `schedule` as the contracts would:
+    every listed auction, and up to `limit` due listings of the buckets."""
+
+    def __init__(self, schedule):
+        RecordingBackend.__init__(self)
+        self.schedule = schedule
+
+    def settle_auctions(self, contract, auction_ids):
+        RecordingBackend.settle_auctions(self, contract, auction_ids)
+        for auction_id in auction_ids:
+            self.schedule.remove((contract, "auction", auction_id))
+
+    def purge_expired(self, contract, buckets, limit):
+        RecordingBackend.purge_expired(self, contract, buckets, limit)
+        due = [key for key, due_time in self.schedule.due.items()
+               if key[0] == contract and key[1] != "auction" and due_time // EXPIRY_BUCKET in buckets]
+        for key in due[:limit]:
+            self.schedule.remove(key)
+
+
+def run(auctions, offers, ops_per_block=20, max_batch=50):
+    """Returns (entries closed, blocks, operations, seconds)."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "feed.jsonl")
+        bench.write_feed(path, synthetic_blocks(auctions, offers, ops_per_block))
+        keeper = Keeper(None, max_batch=max_batch)
+        keeper.backend = ConfirmingBackend(keeper.schedule)
+        start = time.perf_counter()
+        level = keeper.run(FileFeed(path))
+        elapsed = time.perf_counter() - start
+    return auctions + offers - len(keeper.schedule), level, keeper.submissions, elapsed
@@ -0,0 +1,96 @@
+"""Settling ended auctions and purging expired listings."""
+
+import logging
+import time
+
+from indexer.feed import events_of_block
+
+from .schedule import EXPIRY_BUCKET, Schedule, seconds
+
+log = logging.getLogger("keeper")
+
+
+def batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class Keeper:
+    """Submits `settle_auctions` and `purge_expired` calls through `backend`.
+
+    The chain time is the timestamp of the last block read from the feed.
+    On each `step`, the ended auctions of each Auction contract are settled
+    in batches of at most `max_batch` ids, oldest first. The expired asks and
+    offers of each Marketplace contract are purged the same way, by giving
+    `purge_expired` the expiry buckets of the batch. An entry that has been
+    submitted is only submitted again if it is still open `retry_after`
+    seconds later.
+    """
+
+    def __init__(self, backend, contracts=None, max_batch=50, retry_after=120):
+        self.backend = backend
+        self.contracts = set(contracts) if contracts else None
+        self.max_batch = max_batch
+        self.retry_after = retry_after
+        self.schedule = Schedule()
+        # (contract, kind, id) -> chain time of the last submission.
+        self.submitted = {}
+        self.submissions = 0
+
+    def apply(self, event):
+        if self.contracts is None or event.contract in self.contracts:
+            self.schedule.apply(event)
+
+    def ready(self, key, now):
+        last = self.submitted.get(key)
+        return last is None or now - last >= self.retry_after
+
+    def submit(self, keys, now, call, contract, *args):
+        try:
+            call(contract, *args)
+        except Exception:
+            log.exception("%s on %s failed", call.__name__, contract)
+            return
+        self.submissions += 1
+        for key in keys:
+            self.submitted[key] = now
+
+    def step(self, now):
+        """Submits everything due at chain time `now` (seconds since the
+        epoch); returns the number of operations submitted."""
+        self.schedule.advance(now)
+        for key in [key for key in self.submitted if key not in self.schedule.open]:
+            del self.submitted[key]
+        before = self.submissions
+        # Due keys per contract, oldest first (`due` is filled in due order).
+        auctions = {}
+        listings = {}
+        for key, due_time in self.schedule.due.items():
+            if self.ready(key, now):
+                books = auctions if key[1] == "auction" else listings
+                books.setdefault(key[0], []).append((key, due_time))
+        for contract, entries in sorted(auctions.items()):
+            for batch in batches(entries, self.max_batch):
+                self.submit([key for key, _ in batch], now, self.backend.settle_auctions, contract,
+                            [key[2] for key, _ in batch])
+        for contract, entries in sorted(listings.items()):
+            for batch in batches(entries, self.max_batch):
+                buckets = sorted(set(due_time // EXPIRY_BUCKET for _, due_time in batch))
+                self.submit([key for key, _ in batch], now, self.backend.purge_expired, contract,
+                            buckets, len(batch))
+        return self.submissions - before
+
+    def run(self, feed, after_level=-1, follow=False, interval=10):
+        """Reads `feed` from `after_level` on, stepping after every block.
+        With `follow`, keeps polling the feed every `interval` seconds.
+        Returns the level of the last block read."""
+        level = after_level
+        while True:
+            for block in feed.blocks(level):
+                for event in events_of_block(block, self.contracts):
+                    self.schedule.apply(event)
+                level = block["header"]["level"]
+                self.step(seconds(block["header"]["timestamp"]))
+            if not follow:
+                return level
+            time.sleep(interval)
@@ -0,0 +1,117 @@
+"""What is due when: auction end times and listing expiries.
+
+`Schedule` folds the contract events into two kinds of entries, keyed by
+(contract, kind, id) with kind one of "auction", "ask" or "offer":
+
+- auctions, due once the chain time is past their `end_time`;
+- asks and offers with an `expiry_time`, due once the expiry bucket it
+  falls in is over, as `purge_expired` skips the buckets still running.
+
+Entries wait in a heap ordered by due time and move to `due` when the clock
+reaches them. They leave the schedule when the event closing them
+(AUCTION_SETTLED, ASK_EXPIRED, ...) comes back through the feed, so an entry
+whose settlement failed or was dropped stays due and is submitted again.
+"""
+
+import calendar
+import heapq
+import time
+
+# Width of the expiry buckets of `Marketplace.purge_expired`, in seconds
+# (`EXPIRY_BUCKET` in marketplace.py).
+EXPIRY_BUCKET = 3600
+
+
+def purge_time(expiry_time):
+    """Due time of a listing expiring at `expiry_time`: the last second of
+    its expiry bucket, so that it is due from the start of the next one."""
+    return (expiry_time // EXPIRY_BUCKET + 1) * EXPIRY_BUCKET - 1
+
+
+def seconds(timestamp):
+    """Seconds since the epoch of an ISO 8601 timestamp as decoded from events."""
+    return calendar.timegm(time.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+class Schedule:
+    def __init__(self):
+        self.heap = []
+        # (contract, kind, id) -> due time, for every open entry.
+        self.open = {}
+        # The open entries whose due time has passed, oldest first.
+        self.due = {}
+        # Highest bid of each open auction: (bidder, amount).
+        self.bids = {}
+        # Editions left of each open ask with an expiry.
+        self.editions = {}
+
+    def __len__(self):
+        return len(self.open)
+
+    def add(self, key, due_time):
+        self.open[key] = due_time
+        heapq.heappush(self.heap, (due_time, key))
+
+    def remove(self, key):
+        self.open.pop(key, None)
+        self.due.pop(key, None)
+        self.bids.pop(key, None)
+        self.editions.pop(key, None)
+
+    def advance(self, now):
+        """Moves the entries due strictly before `now` to `due`. Heap entries
+        of keys that were closed in the meantime are dropped."""
+        while self.heap and self.heap[0][0] < now:
+            due_time, key = heapq.heappop(self.heap)
+            if self.open.get(key) == due_time:
+                self.due[key] = due_time
+
+    def apply(self, event):
+        handler = getattr(self, "on_" + (event.tag or ""), None)
+        if handler is not None:
+            handler(event.contract, event.payload)
+
+    # Auctions
+
+    def on_AUCTION_CREATED(self, contract, p):
+        self.add((contract, "auction", p["auction_id"]), seconds(p["end_time"]))
+
+    def on_NEW_BID(self, contract, p):
+        key = (contract, "auction", p["auction_id"])
+        if key in self.open:
+            self.bids[key] = (p["bidder"], p["amount"])
+
+    def on_AUCTION_SETTLED(self, contract, p):
+        self.remove((contract, "auction", p["auction_id"]))
+
+    on_AUCTION_CANCELED = on_AUCTION_SETTLED
+
+    # Marketplace
+
+    def on_ASK_CREATED(self, contract, p):
+        if p["expiry_time"] is not None:
+            key = (contract, "ask", p["ask_id"])
+            self.add(key, purge_time(seconds(p["expiry_time"])))
+            self.editions[key] = p["editions"]
+
+    def on_ASK_FULFILLED(self, contract, p):
+        key = (contract, "ask", p["ask_id"])
+        if key in self.editions:
+            self.editions[key] -= p["quantity"]
+            if self.editions[key] <= 0:
+                self.remove(key)
+
+    def on_ASK_RETRACTED(self, contract, p):
+        self.remove((contract, "ask", p["ask_id"]))
+
+    on_ASK_EXPIRED = on_ASK_RETRACTED
+
+    def on_OFFER_CREATED(self, contract, p):
+        if p["expiry_time"] is not None:
+            self.add((contract, "offer", p["offer_id"]), purge_time(seconds(p["expiry_time"])))
+
+    def on_OFFER_FULFILLED(self, contract, p):
+        self.remove((contract, "offer", p["offer_id"]))
+
+    on_OFFER_RETRACTED = on_OFFER_FULFILLED
+    on_OFFER_EXPIRED = on_OFFER_FULFILLED
@@ -0,0 +1,210 @@
+import time
+
+import smartpy as sp
+
+import keeper
+from indexer.bench import TOKEN, event, int_, operation, pair, some, string
+from indexer.feed import events_of_block
+
+FA2_contract = sp.io.import_stored_contract('FA2.py')
+auction = sp.io.import_stored_contract('auction.py')
+marketplace = sp.io.import_stored_contract('marketplace.py')
+
+# Keeper simulation
+##
+# A local stand-in for the chain, so that the keeper's scheduling and
+# batching can be tested and load-tested without a node. The contracts are
+# originated in a SmartPy test scenario and `ScenarioBackend` runs the
+# keeper's calls against them.
+#
+# The scenario is only executed once the test function has returned, so the
+# events the contracts emit can't be read back while the keeper runs. The
+# simulation keeps a model of the open auctions and offers instead, derives
+# the events each call emits from it, and has the scenario check the model
+# against the contract storage after every call. The events are encoded in
+# Micheline as the contracts emit them (`indexer.bench.TYPES`) and decoded with
+# `events_of_block`, as the keeper reads them from a node. Run it from the
+# repository root so the `keeper` and `indexer` packages can be imported:
+#
+#     SmartPy.sh test keeper_simulation.py out/
+##
+
+ADMIN = sp.address("tz1QXAR4RsVTXYU75XBU9ctMYkWYFnZYbgzk")
+KEEPER_ADDRESS = "tz1ooKEEPER"
+KEEPER = sp.address(KEEPER_ADDRESS)
+ALICE = "tz1ooALICE"
+BOB = "tz1ooBOB"
+CAROL = "tz1ooCAROL"
+BLOCK_TIME = 30
+
+
+def iso(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+
+class Simulation:
+    """An Auction and a Marketplace contract trading the tokens of one FA2
+    contract, driven block by block: `advance` moves the clock and lets the
+    keeper step after every block."""
+
+    def __init__(self, scenario, max_batch = 50, retry_after = 120):
+        self.scenario = scenario
+        self.now = 0
+        self.level = 0
+        metadata = sp.map({"": sp.utils.bytes_of_string("https://example.com")})
+        self.fa2 = FA2_contract.FA2(config = marketplace.environment_config(), metadata = metadata, admin = ADMIN)
+        self.contracts = {
+            "auction": auction.Auction(mods = [ADMIN], fund_operator = ADMIN),
+            "marketplace": marketplace.Marketplace(mods = [ADMIN], fund_operator = ADMIN),
+        }
+        scenario += self.fa2
+        for contract in self.contracts.values():
+            scenario += contract
+        self.keeper = keeper.Keeper(ScenarioBackend(self), max_batch = max_batch, retry_after = retry_after)
+        # Model of the open auctions and offers: id -> end or expiry time.
+        self.auctions = {}
+        self.offers = {}
+        self.next_auction_id = 0
+        self.next_offer_id = 0
+        self.sellers = set()
+
+    def run(self, call, **kwargs):
+        self.scenario += call.run(now = sp.timestamp(self.now), **kwargs)
+
+    def emit(self, contract, tag, payload):
+        block = {"header": {"level": self.level, "timestamp": iso(self.now)},
+                 "operations": [[], [], [], [operation(KEEPER_ADDRESS, contract, 0, [event(contract, tag, payload)])]]}
+        for emitted in events_of_block(block):
+            self.keeper.apply(emitted)
+
+    def advance(self, blocks = 1):
+        for _ in range(blocks):
+            self.now += BLOCK_TIME
+            self.level += 1
+            self.keeper.step(self.now)
+
+    # Chain activity
+
+    def create_auction(self, creator, end_time):
+        auction_id = self.next_auction_id
+        self.next_auction_id += 1
+        self.run(self.fa2.mint(address = sp.address(creator), amount = 1, token_id = auction_id,
+                               metadata = sp.map({"": sp.bytes("0x00")})), sender = ADMIN)
+        if creator not in self.sellers:
+            self.sellers.add(creator)
+            self.run(self.fa2.update_operators_for_all([sp.variant("add_operator_for_all", sp.record(
+                owner = sp.address(creator), operator = self.contracts["auction"].address))]), sender = sp.address(creator))
+        self.run(self.contracts["auction"].create_auction(sp.record(
+            creator = sp.address(creator),
+            token = sp.record(address = self.fa2.address, token_id = sp.nat(auction_id)),
+            start_time = sp.timestamp(0),
+            end_time = sp.timestamp(end_time),
+            price_increment = sp.tez(1),
+            current_price = sp.tez(0),
+            highest_bidder = sp.address(creator),
+            split_id = sp.nat(0))), sender = sp.address(creator))
+        self.auctions[auction_id] = end_time
+        self.emit("auction", "AUCTION_CREATED", pair(int_(auction_id), string(creator), pair(string(TOKEN), int_(auction_id)),
+                                                     int_(0), int_(end_time), int_(1000000), int_(0), int_(0)))
+        return auction_id
+
+    def bid(self, auction_id, bidder, tez):
+        self.run(self.contracts["auction"].bid(auction_id), sender = sp.address(bidder), amount = sp.tez(tez))
+        self.emit("auction", "NEW_BID", pair(int_(auction_id), string(bidder), int_(tez * 1000000)))
+
+    def offer(self, creator, tez, expiry_time):
+        offer_id = self.next_offer_id
+        self.next_offer_id += 1
+        self.run(self.contracts["marketplace"].offer(sp.record(
+            creator = sp.address(creator),
+            token = sp.record(address = self.fa2.address, token_id = sp.nat(0)),
+            amount = sp.tez(tez),
+            expiry_time = sp.some(sp.timestamp(expiry_time)),
+            split_id = sp.nat(0))), sender = sp.address(creator), amount = sp.tez(tez))
+        self.offers[offer_id] = expiry_time
+        self.emit("marketplace", "OFFER_CREATED", pair(int_(offer_id), string(creator), pair(string(TOKEN), int_(0)),
+                                                       int_(tez * 1000000), some(int_(expiry_time)), int_(0)))
+        return offer_id
+
+
+class ScenarioBackend(keeper.Backend):
+    """Runs the keeper's calls in the scenario of `simulation`, as sent by
+    the KEEPER account in the block being stepped."""
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+
+    def settle_auctions(self, contract, auction_ids):
+        sim = self.simulation
+        sim.run(sim.contracts[contract].settle_auctions(sp.list(auction_ids, t = sp.TNat)), sender = KEEPER)
+        for auction_id in auction_ids:
+            if auction_id in sim.auctions and sim.now > sim.auctions[auction_id]:
+                del sim.auctions[auction_id]
+                sim.emit(contract, "AUCTION_SETTLED", int_(auction_id))
+            sim.scenario.verify(sim.contracts[contract].data.auctions.contains(auction_id) == (auction_id in sim.auctions))
+
+    def purge_expired(self, contract, buckets, limit):
+        sim = self.simulation
+        sim.run(sim.contracts[contract].purge_expired(sp.record(buckets = buckets, limit = limit)), sender = KEEPER)
+        # The contract visits the buckets in the order given, and the ids of
+        # a bucket in increasing order, once the bucket's hour is over.
+        visited = []
+        for bucket in buckets:
+            visited += sorted(offer_id for offer_id, expiry_time in sim.offers.items()
+                              if expiry_time // marketplace.EXPIRY_BUCKET == bucket)
+        purged = 0
+        for offer_id in visited:
+            if purged < limit and sim.now >= keeper.purge_time(sim.offers[offer_id]) + 1:
+                del sim.offers[offer_id]
+                sim.emit(contract, "OFFER_EXPIRED", int_(offer_id))
+                purged += 1
+            sim.scenario.verify(sim.contracts[contract].data.offers.contains(offer_id) == (offer_id in sim.offers))
+
+
+@sp.add_test(name = "Keeper")
+def test():
+    sc = sp.test_scenario()
+    sc.h1("Keeper on a simulated chain")
+    sc.p("Five auctions end at t=100 and t=200 and three offers expire at t=150, t=160 and t=5000. The keeper settles at most two auctions per operation and follows the chain in 30 second blocks until t=3630, past the end of the first expiry bucket.")
+    sim = Simulation(sc, max_batch = 2)
+    auctions = sim.contracts["auction"]
+    mp = sim.contracts["marketplace"]
+
+    sc.h2("Auctions and offers")
+    for end_time in [100, 100, 100, 200, 200]:
+        sim.create_auction(ALICE, end_time)
+    sim.bid(0, BOB, 2)
+    sim.bid(3, BOB, 2)
+    for tez, expiry_time in [(1, 150), (2, 160), (4, 5000)]:
+        sim.offer(CAROL, tez, expiry_time)
+
+    sc.h2("Keeper")
+    sim.advance(121)
+    for auction_id in range(5):
+        sc.verify(~auctions.data.auctions.contains(auction_id))
+    sc.verify(sim.fa2.data.ledger[sim.fa2.ledger_key.make(sp.address(BOB), 0)].balance == 1)
+    sc.verify(sim.fa2.data.ledger[sim.fa2.ledger_key.make(sp.address(ALICE), 1)].balance == 1)
+    sc.verify(mp.data.offers.contains(2))
+    sc.verify(mp.data.balances[sp.address(CAROL)] == sp.tez(3))
+    # Two settlements for the three auctions ending at t=100, one purge for
+    # both expired offers and one settlement for the auctions ending at t=200.
+    assert sim.keeper.submissions == 4, sim.keeper.submissions
+    assert len(sim.keeper.schedule) == 1
+
+
+@sp.add_test(name = "Keeper-Load", is_default = False)
+def test():
+    sc = sp.test_scenario()
+    sc.h1("Keeper load: lots closing together")
+    sc.p("The lots of a timed sale end within ten minutes of each other. The keeper settles them in batches of at most 50 auctions; the number of operations each sale size takes is printed below. Scenarios don't report gas: the auction_settle_auctions_lots and marketplace_purge_expired_purged cases of benchmark.py measure the keeper's calls for batches of 1 to 100 entries, with `python bench_report.py`.")
+    sc.table_of_contents()
+    for lots in [50, 200]:
+        sc.h2("%d lots" % lots)
+        sim = Simulation(sc, max_batch = 50)
+        for i in range(lots):
+            auction_id = sim.create_auction(ALICE, 600 + (i * 7) % 600)
+            if i % 2 == 0:
+                sim.bid(auction_id, BOB, 1)
+        sim.advance(1300 // BLOCK_TIME)
+        assert len(sim.keeper.schedule) == 0
+        sc.p("%d lots settled with %d operations" % (lots, sim.keeper.submissions))
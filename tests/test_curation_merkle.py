@@ -0,0 +1,91 @@
+import hashlib
+
+import pytest
+
+import curation_merkle
+from curation_merkle import BASE, EDPK_PREFIX, EDSIG_PREFIX, L, Q, TZ1_PREFIX, Tree, approved, point_mul, verify
+from indexer.micheline import b58check
+
+
+def compress(point):
+    z = pow(point[2], Q - 2, Q)
+    x, y = point[0] * z % Q, point[1] * z % Q
+    return (y | (x & 1) << 255).to_bytes(32, "little")
+
+
+def sign(seed, message):
+    """RFC 8032 ed25519 signature; returns (public key, signature)."""
+    h = hashlib.sha512(seed).digest()
+    a = int.from_bytes(h[:32], "little") & ((1 << 254) - 8) | (1 << 254)
+    public_key = compress(point_mul(a, BASE))
+    r = int.from_bytes(hashlib.sha512(h[32:] + message).digest(), "little") % L
+    big_r = compress(point_mul(r, BASE))
+    k = int.from_bytes(hashlib.sha512(big_r + public_key + message).digest(), "little") % L
+    return public_key, big_r + ((r + k * a) % L).to_bytes(32, "little")
+
+
+class Curator:
+    def __init__(self, name):
+        self.seed = hashlib.sha256(name.encode()).digest()
+        self.public_key = sign(self.seed, b"")[0]
+        self.address = b58check(TZ1_PREFIX + hashlib.blake2b(self.public_key, digest_size=20).digest())
+
+    def vote(self, round_, proposal_id, in_favour):
+        message = curation_merkle.blake2b(curation_merkle.pack_vote(round_, proposal_id, in_favour))
+        public_key, signature = sign(self.seed, message)
+        return {"in_favour": in_favour, "public_key": b58check(EDPK_PREFIX + public_key),
+                "signature": b58check(EDSIG_PREFIX + signature)}
+
+
+ALICE, BOB, CAROL = Curator("alice"), Curator("bob"), Curator("carol")
+
+
+def test_rfc8032_vector():
+    seed = bytes.fromhex("9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60")
+    public_key, signature = sign(seed, b"")
+    assert public_key.hex() == "d75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a"
+    assert signature.hex() == ("e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e065224901555"
+                               "fb8821590a33bacc61e39701cf9b46bd25bf5f0595bbe24655141438e7a100b")
+    assert curation_merkle.ed25519_verify(public_key, b"", signature)
+    assert not curation_merkle.ed25519_verify(public_key, b"\x00", signature)
+
+
+def test_pack_vote():
+    # PACK of Pair 1 (Pair 300 True) / Pair 1 (Pair 300 False).
+    assert curation_merkle.pack_vote(1, 300, True).hex() == "0507070001070700ac04030a"
+    assert curation_merkle.pack_vote(1, 300, False).hex() == "0507070001070700ac040303"
+
+
+def test_approved_counts_signed_votes():
+    votes = {
+        "1": {ALICE.address: ALICE.vote(3, 1, True), BOB.address: BOB.vote(3, 1, False)},
+        "2": {ALICE.address: ALICE.vote(3, 2, False), BOB.address: BOB.vote(3, 2, False),
+              CAROL.address: CAROL.vote(3, 2, True)},
+        "4": {},
+    }
+    assert approved(3, votes, 40) == [1]
+    assert approved(3, votes, 30) == [1, 2]
+
+
+def test_approved_rejects_forged_ballots():
+    vote = ALICE.vote(3, 1, False)
+    with pytest.raises(ValueError, match="bad signature"):
+        approved(3, {"1": {ALICE.address: dict(vote, in_favour=True)}}, 40)
+    with pytest.raises(ValueError, match="bad signature"):
+        approved(4, {"1": {ALICE.address: vote}}, 40)
+    with pytest.raises(ValueError, match="bad signature"):
+        approved(3, {"2": {ALICE.address: vote}}, 40)
+    with pytest.raises(ValueError, match="not theirs"):
+        approved(3, {"1": {BOB.address: vote}}, 40)
+    with pytest.raises(ValueError, match="not a curator"):
+        approved(3, {"1": {ALICE.address: vote}}, 40, curators={BOB.address})
+    with pytest.raises(ValueError, match="checksum"):
+        approved(3, {"1": {ALICE.address: dict(vote, signature=vote["signature"][:-1] + "1")}}, 40)
+
+
+def test_proofs():
+    tree = Tree(3, [7, 1, 4, 9, 4])
+    for proposal_id in [1, 4, 7, 9]:
+        assert verify(3, proposal_id, tree.proof(proposal_id), tree.root)
+    assert not verify(3, 2, tree.proof(1), tree.root)
+    assert not verify(2, 1, tree.proof(1), tree.root)
@@ -0,0 +1,188 @@
+import json
+import os
+
+from indexer.bench import (ALICE, AUCTION, BOB, MARKETPLACE, TOKEN, event, int_, none, operation, pair, some,
+                           string, synthetic_blocks, write_feed)
+from indexer.feed import FileFeed, events_of_block
+from indexer.indexer import Indexer
+from indexer.store import Store
+
+CAROL = "tz1ooCAROL"
+
+
+def token(token_id):
+    return pair(string(TOKEN), int_(token_id))
+
+
+def block(level, *operations):
+    return {"header": {"level": level, "timestamp": "2024-01-01T00:%02d:00Z" % level},
+            "operations": [[], [], [], list(operations)]}
+
+
+def ask_created(ask_id, price, editions, expiry=None):
+    return event(MARKETPLACE, "ASK_CREATED", pair(int_(ask_id), string(ALICE), token(ask_id), int_(price),
+                 int_(editions), none() if expiry is None else some(int_(expiry)), int_(0)))
+
+
+def ask_fulfilled(ask_id, quantity, amount):
+    return event(MARKETPLACE, "ASK_FULFILLED", pair(int_(ask_id), string(BOB), int_(quantity), int_(amount)))
+
+
+def offer_created(offer_id, price, expiry=None):
+    return event(MARKETPLACE, "OFFER_CREATED", pair(int_(offer_id), string(BOB), token(offer_id), int_(price),
+                 none() if expiry is None else some(int_(expiry)), int_(0)))
+
+
+def credited(contract, recipient, amount):
+    return event(contract, "BALANCE_CREDITED", pair(string(recipient), int_(amount)))
+
+
+def auction_created(auction_id, end_time):
+    return event(AUCTION, "AUCTION_CREATED", pair(int_(auction_id), string(ALICE), token(auction_id), int_(0),
+                 int_(end_time), int_(100000), int_(0), int_(0)))
+
+
+def new_bid(auction_id, bidder, amount):
+    return event(AUCTION, "NEW_BID", pair(int_(auction_id), string(bidder), int_(amount)))
+
+
+def market_blocks():
+    """Asks and offers created, filled and expired, auctions bid on and
+    settled, and a withdrawal, over five blocks."""
+    return [
+        block(1,
+              operation(ALICE, MARKETPLACE, 0, [ask_created(0, 1000000, 2)]),
+              operation(ALICE, MARKETPLACE, 0, [ask_created(1, 3000000, 1, expiry=3600)]),
+              operation(BOB, MARKETPLACE, 2000000, [offer_created(0, 2000000)]),
+              operation(BOB, MARKETPLACE, 4000000, [offer_created(1, 4000000, expiry=3600)]),
+              operation(ALICE, AUCTION, 0, [auction_created(0, 600)]),
+              operation(ALICE, AUCTION, 0, [auction_created(1, 600)])),
+        block(2,
+              operation(BOB, MARKETPLACE, 1000000, [ask_fulfilled(0, 1, 1000000),
+                                                    credited(MARKETPLACE, ALICE, 1000000)]),
+              operation(BOB, AUCTION, 1000000, [new_bid(0, BOB, 1000000)]),
+              operation(CAROL, AUCTION, 2000000, [new_bid(0, CAROL, 2000000),
+                                                  credited(AUCTION, BOB, 1000000)])),
+        block(3,
+              operation(BOB, MARKETPLACE, 1000000, [ask_fulfilled(0, 1, 1000000),
+                                                    credited(MARKETPLACE, ALICE, 1000000)]),
+              operation(ALICE, MARKETPLACE, 0, [event(MARKETPLACE, "OFFER_FULFILLED", pair(int_(0), string(ALICE))),
+                                                credited(MARKETPLACE, ALICE, 2000000)])),
+        block(4,
+              operation(CAROL, MARKETPLACE, 0, [event(MARKETPLACE, "ASK_EXPIRED", int_(1)),
+                                                event(MARKETPLACE, "OFFER_EXPIRED", int_(1)),
+                                                credited(MARKETPLACE, BOB, 4000000)]),
+              operation(CAROL, AUCTION, 0, [event(AUCTION, "AUCTION_SETTLED", int_(0)),
+                                            credited(AUCTION, ALICE, 2000000),
+                                            event(AUCTION, "AUCTION_SETTLED", int_(1))])),
+        block(5,
+              operation(ALICE, MARKETPLACE, 0, [event(MARKETPLACE, "BALANCE_WITHDRAWN",
+                                                      pair(string(ALICE), int_(4000000)))])),
+    ]
+
+
+def index(tmp_path, blocks, store=None, name="test"):
+    path = os.path.join(str(tmp_path), "feed.jsonl")
+    write_feed(path, blocks)
+    store = store or Store()
+    count = Indexer(store).run(FileFeed(path), name)
+    return store, count
+
+
+def rows(store, sql):
+    return store.execute(sql).fetchall()
+
+
+def test_events_of_block_keeps_sender_and_amount():
+    events = list(events_of_block(market_blocks()[1]))
+    assert [e.tag for e in events] == ["ASK_FULFILLED", "BALANCE_CREDITED", "NEW_BID", "NEW_BID",
+                                       "BALANCE_CREDITED"]
+    assert events[0].payload == {"ask_id": 0, "buyer": BOB, "quantity": 1, "amount": 1000000}
+    assert (events[0].contract, events[0].sender, events[0].amount) == (MARKETPLACE, BOB, 1000000)
+    assert (events[3].sender, events[3].amount) == (CAROL, 2000000)
+    assert [e.contract for e in events_of_block(market_blocks()[1], {AUCTION})] == [AUCTION] * 3
+
+
+def test_events_of_failed_operations_are_skipped():
+    failed = operation(BOB, MARKETPLACE, 1000000, [ask_fulfilled(0, 1, 1000000)])
+    failed["contents"][0]["metadata"]["operation_result"]["status"] = "backtracked"
+    assert list(events_of_block(block(1, failed))) == []
+
+
+def test_asks(tmp_path):
+    store, _ = index(tmp_path, market_blocks()[:2])
+    assert rows(store, "SELECT ask_id, editions, expiry_time FROM asks ORDER BY ask_id") == [
+        (0, 1, None), (1, 1, "1970-01-01T01:00:00Z")]
+    store, _ = index(tmp_path, market_blocks())
+    assert rows(store, "SELECT * FROM asks") == []
+    assert rows(store, "SELECT kind, ref_id, seller, buyer, price, quantity FROM sales WHERE kind = 'ask'") == [
+        ("ask", 0, ALICE, BOB, 1000000, 1), ("ask", 0, ALICE, BOB, 1000000, 1)]
+
+
+def test_offers(tmp_path):
+    store, _ = index(tmp_path, market_blocks()[:1])
+    assert rows(store, "SELECT offer_id, creator, price FROM offers ORDER BY offer_id") == [
+        (0, BOB, 2000000), (1, BOB, 4000000)]
+    store, _ = index(tmp_path, market_blocks())
+    assert rows(store, "SELECT * FROM offers") == []
+    assert rows(store, "SELECT ref_id, seller, buyer, price FROM sales WHERE kind = 'offer'") == [
+        (0, ALICE, BOB, 2000000)]
+
+
+def test_auctions(tmp_path):
+    store, _ = index(tmp_path, market_blocks()[:3])
+    assert rows(store, "SELECT auction_id, current_price, highest_bidder FROM auctions ORDER BY auction_id") == [
+        (0, 2000000, CAROL), (1, 0, ALICE)]
+    store, _ = index(tmp_path, market_blocks())
+    assert rows(store, "SELECT * FROM auctions") == []
+    # The auction without bids goes back to its creator: no sale.
+    assert rows(store, "SELECT ref_id, seller, buyer, price FROM sales WHERE kind = 'auction'") == [
+        (0, ALICE, CAROL, 2000000)]
+
+
+def test_balances(tmp_path):
+    store, _ = index(tmp_path, market_blocks()[:4])
+    assert rows(store, "SELECT contract, address, amount FROM balances ORDER BY contract, address") == [
+        (MARKETPLACE, ALICE, 4000000), (MARKETPLACE, BOB, 4000000), (AUCTION, ALICE, 2000000),
+        (AUCTION, BOB, 1000000)]
+    store, _ = index(tmp_path, market_blocks())
+    assert rows(store, "SELECT contract, address, amount FROM balances ORDER BY contract, address") == [
+        (MARKETPLACE, BOB, 4000000), (AUCTION, ALICE, 2000000), (AUCTION, BOB, 1000000)]
+
+
+def dump(store):
+    return [rows(store, "SELECT * FROM %s ORDER BY 1, 2, 3" % table)
+            for table in ["asks", "offers", "auctions", "sales", "balances"]]
+
+
+def test_restart_from_checkpoint(tmp_path):
+    blocks = market_blocks()
+    db = os.path.join(str(tmp_path), "views.db")
+    store, count = index(tmp_path, blocks[:2], Store(db))
+    assert (count, store.checkpoint("test")) == (11, 2)
+    store.close()
+    store, count = index(tmp_path, blocks, Store(db))
+    assert (count, store.checkpoint("test")) == (11, 5)
+    fresh, total = index(tmp_path, blocks)
+    assert total == 22
+    assert dump(store) == dump(fresh)
+    # Another feed name starts from scratch.
+    assert Store(db).checkpoint("other") == -1
+
+
+def test_directory_feed(tmp_path):
+    blocks = market_blocks()
+    for b in blocks:
+        with open(os.path.join(str(tmp_path), "%d.json" % b["header"]["level"]), "w") as f:
+            json.dump(b, f)
+    assert [b["header"]["level"] for b in FileFeed(str(tmp_path)).blocks(2)] == [3, 4, 5]
+    store = Store()
+    assert Indexer(store).run(FileFeed(str(tmp_path))) == 22
+    assert dump(store) == dump(index(tmp_path, blocks)[0])
+
+
+def test_synthetic_blocks_emit_the_requested_events():
+    for events in [1, 2, 7, 20, 21, 1001]:
+        blocks = list(synthetic_blocks(events, ops_per_block=4))
+        assert sum(len(list(events_of_block(b))) for b in blocks) == events
+        assert all(len(b["operations"][3]) <= 4 for b in blocks)
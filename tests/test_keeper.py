@@ -0,0 +1,180 @@
+import time
+
+from indexer.feed import Event
+from keeper import Keeper, RecordingBackend, Schedule, purge_time
+from keeper import bench
+
+AUCTION = "KT1auction"
+AUCTION_2 = "KT1auction2"
+MARKETPLACE = "KT1marketplace"
+
+
+def iso(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(seconds))
+
+
+def ev(contract, tag, **payload):
+    return Event(0, None, None, contract, tag, payload, None, 0)
+
+
+def auction(auction_id, end_time, contract=AUCTION):
+    return ev(contract, "AUCTION_CREATED", auction_id=auction_id, creator="tz1alice", end_time=iso(end_time))
+
+
+def offer(offer_id, expiry_time):
+    return ev(MARKETPLACE, "OFFER_CREATED", offer_id=offer_id, creator="tz1bob",
+              expiry_time=None if expiry_time is None else iso(expiry_time))
+
+
+def ask(ask_id, expiry_time, editions=1):
+    return ev(MARKETPLACE, "ASK_CREATED", ask_id=ask_id, creator="tz1alice", editions=editions,
+              expiry_time=None if expiry_time is None else iso(expiry_time))
+
+
+def keeper_with(*events, **kwargs):
+    keeper = Keeper(RecordingBackend(), **kwargs)
+    for event in events:
+        keeper.apply(event)
+    return keeper
+
+
+# Schedule
+
+def test_schedule_moves_entries_due_strictly_before_now_in_order():
+    schedule = Schedule()
+    for auction_id, end_time in [(0, 300), (1, 100), (2, 200)]:
+        schedule.apply(auction(auction_id, end_time))
+    schedule.advance(100)
+    assert schedule.due == {}
+    schedule.advance(150)
+    assert list(schedule.due) == [(AUCTION, "auction", 1)]
+    schedule.advance(1000)
+    assert list(schedule.due) == [(AUCTION, "auction", 1), (AUCTION, "auction", 2), (AUCTION, "auction", 0)]
+    assert len(schedule) == 3
+
+
+def test_schedule_closes_entries_from_their_events():
+    schedule = Schedule()
+    for auction_id in range(3):
+        schedule.apply(auction(auction_id, 100))
+    schedule.apply(ev(AUCTION, "NEW_BID", auction_id=0, bidder="tz1bob", amount=1000000))
+    assert schedule.bids == {(AUCTION, "auction", 0): ("tz1bob", 1000000)}
+    schedule.apply(ev(AUCTION, "AUCTION_SETTLED", auction_id=0))
+    schedule.apply(ev(AUCTION, "AUCTION_CANCELED", auction_id=1))
+    schedule.advance(1000)
+    # Heap entries of closed keys are dropped when they come up.
+    assert list(schedule.due) == [(AUCTION, "auction", 2)]
+    assert schedule.bids == {}
+    assert len(schedule) == 1
+
+
+def test_schedule_tracks_ask_editions():
+    schedule = Schedule()
+    schedule.apply(ask(0, 100, editions=3))
+    schedule.apply(ask(1, None))
+    assert len(schedule) == 1
+    schedule.apply(ev(MARKETPLACE, "ASK_FULFILLED", ask_id=0, quantity=2))
+    assert schedule.editions == {(MARKETPLACE, "ask", 0): 1}
+    schedule.apply(ev(MARKETPLACE, "ASK_FULFILLED", ask_id=0, quantity=1))
+    assert len(schedule) == 0
+
+
+def test_listings_are_due_when_their_expiry_bucket_is_over():
+    assert purge_time(0) == purge_time(3599) == 3599
+    assert purge_time(3600) == 7199
+    schedule = Schedule()
+    schedule.apply(offer(0, 150))
+    schedule.apply(offer(1, 5000))
+    schedule.apply(offer(2, None))
+    schedule.advance(3599)
+    assert schedule.due == {}
+    schedule.advance(3600)
+    assert list(schedule.due) == [(MARKETPLACE, "offer", 0)]
+    schedule.apply(ev(MARKETPLACE, "OFFER_EXPIRED", offer_id=0))
+    assert len(schedule) == 1
+
+
+# Keeper
+
+def test_step_settles_ended_auctions_in_batches():
+    keeper = keeper_with(*[auction(i, 100 + i) for i in range(5)], auction(0, 100, AUCTION_2),
+                         auction(5, 1000), max_batch=2)
+    assert keeper.step(500) == 4
+    assert keeper.backend.calls == [
+        ("settle_auctions", AUCTION, [0, 1]),
+        ("settle_auctions", AUCTION, [2, 3]),
+        ("settle_auctions", AUCTION, [4]),
+        ("settle_auctions", AUCTION_2, [0]),
+    ]
+
+
+def test_step_purges_expired_listings_by_bucket():
+    keeper = keeper_with(offer(0, 100), ask(1, 200), offer(1, 3700), offer(2, 9000), max_batch=2)
+    assert keeper.step(3600) == 1
+    keeper.apply(ev(MARKETPLACE, "OFFER_EXPIRED", offer_id=0))
+    keeper.apply(ev(MARKETPLACE, "ASK_EXPIRED", ask_id=1))
+    assert keeper.step(7200) == 1
+    assert keeper.backend.calls == [
+        ("purge_expired", MARKETPLACE, [0], 2),
+        ("purge_expired", MARKETPLACE, [1], 1),
+    ]
+
+
+def test_step_batches_span_buckets():
+    keeper = keeper_with(offer(0, 100), offer(1, 3700), offer(2, 3800), max_batch=2)
+    keeper.step(7200)
+    assert keeper.backend.calls == [
+        ("purge_expired", MARKETPLACE, [0, 1], 2),
+        ("purge_expired", MARKETPLACE, [1], 1),
+    ]
+
+
+def test_submitted_entries_are_retried_only_while_open():
+    keeper = keeper_with(auction(0, 100), auction(1, 100), retry_after=120)
+    assert keeper.step(200) == 1
+    assert keeper.step(230) == 0
+    keeper.apply(ev(AUCTION, "AUCTION_SETTLED", auction_id=0))
+    assert keeper.step(320) == 1
+    assert keeper.backend.calls == [
+        ("settle_auctions", AUCTION, [0, 1]),
+        ("settle_auctions", AUCTION, [1]),
+    ]
+    keeper.apply(ev(AUCTION, "AUCTION_SETTLED", auction_id=1))
+    assert keeper.step(1000) == 0
+    assert keeper.submitted == {}
+
+
+class FailingBackend(RecordingBackend):
+    def __init__(self, failures):
+        RecordingBackend.__init__(self)
+        self.failures = failures
+
+    def settle_auctions(self, contract, auction_ids):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("node unreachable")
+        RecordingBackend.settle_auctions(self, contract, auction_ids)
+
+
+def test_failed_submissions_are_retried_on_the_next_step():
+    keeper = Keeper(FailingBackend(1))
+    keeper.apply(auction(0, 100))
+    assert keeper.step(200) == 0
+    assert keeper.step(230) == 1
+    assert keeper.backend.calls == [("settle_auctions", AUCTION, [0])]
+
+
+def test_events_of_other_contracts_are_skipped():
+    keeper = Keeper(RecordingBackend(), contracts=[AUCTION])
+    keeper.apply(auction(0, 100, AUCTION_2))
+    keeper.apply(offer(0, 100))
+    keeper.apply(auction(0, 100))
+    keeper.step(10000)
+    assert keeper.backend.calls == [("settle_auctions", AUCTION, [0])]
+
+
+def test_bench_closes_every_entry():
+    entries, blocks, submissions, _ = bench.run(120, 80, ops_per_block=20, max_batch=50)
+    assert entries == 200
+    assert blocks > 0
+    assert submissions < entries